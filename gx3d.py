@@ -15,6 +15,15 @@ import gc
 import enum
 import ctypes
 import collections
+import struct
+import zlib
+import concurrent.futures
+import multiprocessing
+import inspect
+import textwrap
+import hashlib
+import json
+import numpy
 
 itemsbl_info = {
     'name': 'Gearoenix 3D Blender',
@@ -57,14 +66,80 @@ class Gearoenix:
     GX3D_FILE = None
     CPP_FILE = None
     RUST_FILE = None
-
-    BAKED_SKYBOX_CUBE_RES = '1024'
-    IRRADIANCE_RES = '128'
-    RADIANCE_RES = '512'
+    # Headers are built in memory and only replaced when their content changes
+    HEADER_PATH = None
+    EXPORT_SPLIT_HEADERS = False
+    header_sections = None
+    header_module = None
+
+    EXPORT_PROFILES = []
+    PROFILE = None
+
+    EXPORT_ATLAS = False
+    ATLAS_SIZE = 2048
+    ATLAS_MAX_TEXTURE_SIZE = 256
+    ATLAS_PADDING = 4
+
+    LIGHT_CUTOFF = 0.01
+
+    EXPORT_PVS = False
+    PVS_CELL_SIZE = 4.0
+    PVS_VOXEL_SIZE = 0.5
+    PVS_MAX_VOXELS = 256
+    PVS_ORIGINS_PER_CELL = 16
+    PVS_RAYS_PER_ITEM = 16
+    PVS_MAX_RAYS_PER_CELL = 4096
+
+    EXPORT_NAVMESH = False
+    NAVMESH_CELL_SIZE = 0.3
+    NAVMESH_CELL_HEIGHT = 0.2
+    NAVMESH_AGENT_HEIGHT = 2.0
+    NAVMESH_AGENT_RADIUS = 0.6
+    NAVMESH_AGENT_MAX_CLIMB = 0.9
+    NAVMESH_AGENT_MAX_SLOPE = 45.0
+    NAVMESH_TILE_SIZE = 32
+    NAVMESH_MAX_VOXELS = 1 << 27
+
+    EXPORT_INSTANCING = False
+    INSTANCING_MIN_COUNT = 2
+
+    # Stored above the byte order bit of the first byte of file
+    HEADER_FLAG_NAME_HASH = 1
+    HEADER_FLAG_COMPACT = 2
+
+    EXPORT_NAME_HASH = False
+    # Varint counts and ids, delta coded id arrays, tables at the end of file
+    EXPORT_COMPACT = False
+    string_pool = None
+
+    EXPORT_STATIC_BATCHING = False
+    BATCH_CELL_SIZE = 32.0
+    BATCH_MAX_VERTICES = 65536
+
+    STREAMING_SCREEN_SIZE = 1920
+    STREAMING_MIN_DISTANCE = 1.0
+
+    AUTO_CONVEX_COLLIDER = False
+
+    EXPORT_FONT_TTF = False
+    FONT_EXTRA_CHARSET = ''.join(chr(c) for c in range(32, 127))
+    FONT_SDF_SIZE = 48
+    FONT_SDF_SPREAD = 6
+    FONT_ATLAS_WIDTH = 1024
+    FONT_ATLAS_MAX_SIZE = 16384
 
     IBL_BAKER_ENVIRONMENT_NAME = 'GEAROENIX_IBL_BAKER'
+    REFLECTION_BAKER_ENVIRONMENT_NAME = 'GEAROENIX_REFLECTION_BAKER'
+    REFLECTION_CACHE_DIRECTORY = os.path.join(
+        tempfile.gettempdir(), 'gearoenix-reflection-cache')
+    REFLECTION_BLEND_DISTANCE = 0.5
 
     last_id = None
+    FIRST_ID = 1024
+    # Persistent registry of ids, key is asset kind and name
+    ids = None
+    used_ids = None
+    used_id_keys = None
 
     @staticmethod
     def terminate(*msgs):
@@ -78,17 +153,18 @@ class Gearoenix:
     @staticmethod
     def initialize():
         """Initializes the class propeties that will be used in other functions"""
-        Gearoenix.last_id = 1024
-        Gearoenix.GX3D_FILE = open(Gearoenix.EXPORT_FILE_PATH, mode='wb')
+        Gearoenix.load_ids()
         dirstr = os.path.dirname(Gearoenix.EXPORT_FILE_PATH)
         filename = Gearoenix.EXPORT_FILE_PATH[len(dirstr) + 1:]
         p_dir_str = os.path.dirname(dirstr)
+        Gearoenix.header_sections = dict()
         if Gearoenix.EXPORT_VULKUST:
             rs_file = filename.replace('.', '_') + '.rs'
-            Gearoenix.RUST_FILE = open(p_dir_str + '/src/' + rs_file, mode='w')
+            Gearoenix.HEADER_PATH = p_dir_str + '/src/' + rs_file
+            Gearoenix.RUST_FILE = io.StringIO()
         elif Gearoenix.EXPORT_GEAROENIX:
-            Gearoenix.CPP_FILE = open(
-                Gearoenix.EXPORT_FILE_PATH + '.hpp', mode='w')
+            Gearoenix.HEADER_PATH = Gearoenix.EXPORT_FILE_PATH + '.hpp'
+            Gearoenix.CPP_FILE = io.StringIO()
         else:
             Gearoenix.terminate('Unexpected engine selection')
 
@@ -126,15 +202,53 @@ class Gearoenix:
     def write_type_id(n):
         Gearoenix.write_u8(n)
 
+    @staticmethod
+    def write_varint(n):
+        """Unsigned LEB128"""
+        data = bytearray()
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            if n == 0:
+                data.append(b)
+                break
+            data.append(b | 0x80)
+        Gearoenix.GX3D_FILE.write(data)
+
+    @staticmethod
+    def write_zigzag(n):
+        Gearoenix.write_varint((n << 1) if n >= 0 else (((-n) << 1) - 1))
+
+    @staticmethod
+    def write_count(n):
+        if Gearoenix.EXPORT_COMPACT:
+            Gearoenix.write_varint(n)
+        else:
+            Gearoenix.write_u64(n)
+
+    @staticmethod
+    def write_ids(ids):
+        """Count and ids, in compact mode ids are zigzag coded deltas of their previous one"""
+        Gearoenix.write_count(len(ids))
+        if not Gearoenix.EXPORT_COMPACT:
+            for i in ids:
+                Gearoenix.write_u64(i)
+            return
+        previous = 0
+        for i in ids:
+            Gearoenix.write_zigzag(i - previous)
+            previous = i
+
     @staticmethod
     def write_instances_ids(instances):
-        Gearoenix.write_u64(len(instances))
-        for ins in instances:
-            Gearoenix.write_id(ins.instance_id)
+        Gearoenix.write_ids([ins.instance_id for ins in instances])
 
     @staticmethod
     def write_id(obj_id):
-        Gearoenix.write_u64(obj_id)
+        if Gearoenix.EXPORT_COMPACT:
+            Gearoenix.write_varint(obj_id)
+        else:
+            Gearoenix.write_u64(obj_id)
 
     @staticmethod
     def write_vector(v, element_count=3):
@@ -147,17 +261,22 @@ class Gearoenix:
             for j in range(0, 4):
                 Gearoenix.write_float(matrix[j][i])
 
+    @staticmethod
+    def write_affine(matrix):
+        """Column major like write_matrix without the last row, which is (0, 0, 0, 1)"""
+        for i in range(0, 4):
+            for j in range(0, 3):
+                Gearoenix.write_float(matrix[j][i])
+
     @staticmethod
     def write_u32_array(arr):
-        Gearoenix.write_u64(len(arr))
+        Gearoenix.write_count(len(arr))
         for i in arr:
             Gearoenix.write_u32(i)
 
     @staticmethod
     def write_u64_array(arr):
-        Gearoenix.write_u64(len(arr))
-        for i in arr:
-            Gearoenix.write_u64(i)
+        Gearoenix.write_ids(arr)
 
     @staticmethod
     def write_bool(b):
@@ -223,10 +342,14 @@ class Gearoenix:
                     return True
         return False
 
+    @staticmethod
+    def to_numpy_matrix(matrix):
+        return numpy.array([[matrix[i][j] for j in range(4)] for i in range(4)])
+
     @staticmethod
     def write_string(s):
         bs = bytes(s, 'utf-8')
-        Gearoenix.write_u64(len(bs))
+        Gearoenix.write_count(len(bs))
         for b in bs:
             Gearoenix.write_u8(b)
 
@@ -247,17 +370,198 @@ class Gearoenix:
 
     @staticmethod
     def write_file(f):
-        Gearoenix.write_u64(len(f))
+        Gearoenix.write_count(len(f))
         Gearoenix.GX3D_FILE.write(f)
 
+    @staticmethod
+    def read_image_pixels(filepath):
+        """Decodes an image file into a top-down (height, width, 4) float32 array"""
+        image = None
+        for img in bpy.data.images:
+            if bpy.path.abspath(img.filepath).strip() == filepath:
+                image = img
+                break
+        loaded = image is None
+        if loaded:
+            image = bpy.data.images.load(filepath)
+        (width, height) = image.size
+        if width < 1 or height < 1:
+            Gearoenix.terminate('Image can not be decoded:', filepath)
+        pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+        image.pixels.foreach_get(pixels)
+        if loaded:
+            bpy.data.images.remove(image)
+        return pixels.reshape((height, width, 4))[::-1]
+
+    @staticmethod
+    def read_image_bytes(filepath):
+        """Decodes an image file into a top-down (height, width, 4) uint8 array"""
+        pixels = Gearoenix.read_image_pixels(filepath)
+        return (numpy.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8)
+
+    @staticmethod
+    def is_png(data):
+        return data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR'
+
+    @staticmethod
+    def is_jpeg(data):
+        return data[:3] == b'\xff\xd8\xff'
+
+    @staticmethod
+    def get_image_channels(data):
+        """Channels that a PNG or JPEG file decodes to, None for other or paletted images"""
+        if Gearoenix.is_png(data):
+            return {0: 1, 2: 3, 4: 2, 6: 4}.get(data[25])
+        if not Gearoenix.is_jpeg(data):
+            return None
+        i = 2
+        while i + 9 < len(data) and data[i] == 0xFF:
+            marker = data[i + 1]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return data[i + 9]
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+        return None
+
+    @staticmethod
+    def png_size(data):
+        if not Gearoenix.is_png(data):
+            Gearoenix.terminate('Image data is not a PNG file')
+        return struct.unpack('>II', data[16:24])
+
+    @staticmethod
+    def encode_png(pixels):
+        """Encodes a top-down (height, width, channels) uint8 array"""
+        (height, width, channels) = pixels.shape
+        color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+        raw = numpy.zeros((height, width * channels + 1), dtype=numpy.uint8)
+        raw[:, 1:] = pixels.reshape((height, width * channels))
+
+        def chunk(tag, data):
+            return struct.pack('>I', len(data)) + tag + data + \
+                struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+        return b'\x89PNG\r\n\x1a\n' + \
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)) + \
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), 9)) + \
+            chunk(b'IEND', b'')
+
+    @staticmethod
+    def encode_rgbe(pixels):
+        """Radiance shared exponent encoding of a (height, width, 3) linear float array"""
+        pixels = numpy.maximum(pixels, 0.0)
+        largest = pixels.max(axis=2)
+        (mantissa, exponent) = numpy.frexp(largest)
+        scale = numpy.where(largest > 1e-32, mantissa * 256.0 / numpy.maximum(largest, 1e-32), 0.0)
+        result = numpy.empty(pixels.shape[:2] + (4,), dtype=numpy.uint8)
+        result[:, :, :3] = numpy.clip(numpy.floor(pixels * scale[..., None]), 0, 255)
+        result[:, :, 3] = numpy.where(largest > 1e-32, numpy.clip(exponent + 128, 0, 255), 0)
+        return result
+
+    @staticmethod
+    def encode_bc(pixels):
+        """
+        Block compression of a (height, width, channels) uint8 array, BC1 for up to
+        three channels and BC3 for four. Image is padded to multiples of 4 by its
+        edges, blocks are in rows from the top.
+        """
+        (height, width, channels) = pixels.shape
+        padded = numpy.pad(pixels, ((0, -height % 4), (0, -width % 4), (0, 0)), mode='edge')
+        (rows, columns) = (padded.shape[0] // 4, padded.shape[1] // 4)
+        blocks = padded.reshape(rows, 4, columns, 4, channels).transpose(
+            0, 2, 1, 3, 4).reshape(-1, 16, channels).astype(numpy.float64)
+        colors = numpy.zeros(blocks.shape[:2] + (3,), dtype=numpy.float64)
+        colors[:, :, :min(channels, 3)] = blocks[:, :, :3]
+        data = Gearoenix.encode_bc1_blocks(colors)
+        if channels == 4:
+            data = numpy.concatenate((Gearoenix.encode_bc4_blocks(blocks[:, :, 3]), data), axis=1)
+        return data.tobytes()
+
+    @staticmethod
+    def encode_bc1_blocks(colors):
+        """(n, 16, 3) colors to (n, 8) bytes, endpoints are the extremes along the principal axis"""
+        count = len(colors)
+        mean = colors.mean(axis=1)
+        centered = colors - mean[:, None, :]
+        covariance = numpy.einsum('nki,nkj->nij', centered, centered)
+        axis = numpy.ones((count, 3))
+        for _ in range(8):
+            axis = numpy.einsum('nij,nj->ni', covariance, axis)
+            axis /= numpy.maximum(numpy.linalg.norm(axis, axis=1), 1e-9)[:, None]
+        projections = numpy.einsum('nki,ni->nk', centered, axis)
+        ends = [mean + axis * projections.max(axis=1)[:, None],
+                mean + axis * projections.min(axis=1)[:, None]]
+        quantized = []
+        for end in ends:
+            rgb = numpy.rint(numpy.clip(end, 0.0, 255.0) * (numpy.array((31, 63, 31)) / 255.0))
+            rgb = rgb.astype(numpy.uint32)
+            quantized.append(((rgb[:, 0] << 11) | (rgb[:, 1] << 5) | rgb[:, 2], numpy.stack((
+                (rgb[:, 0] << 3) | (rgb[:, 0] >> 2),
+                (rgb[:, 1] << 2) | (rgb[:, 1] >> 4),
+                (rgb[:, 2] << 3) | (rgb[:, 2] >> 2)), axis=1).astype(numpy.float64)))
+        ((c0, p0), (c1, p1)) = quantized
+        # Four color mode needs the first endpoint to be bigger
+        swap = c0 < c1
+        (c0, c1) = (numpy.where(swap, c1, c0), numpy.where(swap, c0, c1))
+        (p0, p1) = (numpy.where(swap[:, None], p1, p0), numpy.where(swap[:, None], p0, p1))
+        palette = numpy.stack((p0, p1, (2.0 * p0 + p1) / 3.0, (p0 + 2.0 * p1) / 3.0), axis=1)
+        distances = ((colors[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=3)
+        indices = distances.argmin(axis=2).astype(numpy.uint32)
+        indices[c0 == c1] = 0
+        bits = (indices << (2 * numpy.arange(16, dtype=numpy.uint32))).sum(axis=1, dtype=numpy.uint32)
+        result = numpy.empty((count, 8), dtype=numpy.uint8)
+        result[:, 0:2] = c0.astype('<u2').view(numpy.uint8).reshape(count, 2)
+        result[:, 2:4] = c1.astype('<u2').view(numpy.uint8).reshape(count, 2)
+        result[:, 4:8] = bits.astype('<u4').view(numpy.uint8).reshape(count, 4)
+        return result
+
+    @staticmethod
+    def encode_bc4_blocks(values):
+        """(n, 16) values to (n, 8) bytes, eight value mode between block maximum and minimum"""
+        count = len(values)
+        a0 = values.max(axis=1)
+        a1 = values.min(axis=1)
+        # Weight of maximum for each palette index
+        weights = numpy.array((7.0, 0.0, 6.0, 5.0, 4.0, 3.0, 2.0, 1.0)) / 7.0
+        palette = numpy.floor(a0[:, None] * weights + a1[:, None] * (1.0 - weights) + 0.5)
+        indices = numpy.abs(values[:, :, None] - palette[:, None, :]).argmin(axis=2).astype(numpy.uint64)
+        indices[a0 == a1] = 0
+        bits = (indices << (3 * numpy.arange(16, dtype=numpy.uint64))).sum(axis=1, dtype=numpy.uint64)
+        result = numpy.empty((count, 8), dtype=numpy.uint8)
+        result[:, 0] = a0.astype(numpy.uint8)
+        result[:, 1] = a1.astype(numpy.uint8)
+        result[:, 2:8] = bits.astype('<u8').view(numpy.uint8).reshape(count, 8)[:, :6]
+        return result
+
+    @staticmethod
+    def downsample_image(pixels):
+        """Halves the resolution of a (height, width, channels) array with a box filter"""
+        p = pixels.astype(numpy.float32)
+        if p.shape[0] > 1:
+            if p.shape[0] % 2 == 1:
+                p = numpy.concatenate((p, p[-1:]), axis=0)
+            p = (p[0::2] + p[1::2]) * 0.5
+        if p.shape[1] > 1:
+            if p.shape[1] % 2 == 1:
+                p = numpy.concatenate((p, p[:, -1:]), axis=1)
+            p = (p[:, 0::2] + p[:, 1::2]) * 0.5
+        if pixels.dtype != numpy.uint8:
+            return p
+        return (p + 0.5).astype(numpy.uint8)
+
     @staticmethod
     def enum_max_check(e):
         if e == e.MAX:
             Gearoenix.terminate('UNEXPECTED')
 
+    @staticmethod
+    def get_header_file():
+        if Gearoenix.EXPORT_VULKUST:
+            return Gearoenix.RUST_FILE
+        return Gearoenix.CPP_FILE
+
     @staticmethod
     def write_start_module(c):
         mod_name = c.__name__
+        Gearoenix.header_module = (mod_name, Gearoenix.get_header_file().tell())
         if Gearoenix.EXPORT_VULKUST:
             Gearoenix.RUST_FILE.write('#[allow(dead_code)]\n')
             Gearoenix.RUST_FILE.write(
@@ -297,6 +601,75 @@ class Gearoenix:
             Gearoenix.RUST_FILE.write('}\n\n')
         elif Gearoenix.EXPORT_GEAROENIX:
             Gearoenix.CPP_FILE.write('}\n')
+        (mod_name, start) = Gearoenix.header_module
+        Gearoenix.header_sections[mod_name] = (start, Gearoenix.get_header_file().tell())
+
+    @staticmethod
+    def write_if_changed(path, content):
+        """Replaces the file atomically only when its content differs, to keep its mtime"""
+        data = content.encode('utf-8')
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                if hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest():
+                    Gearoenix.log_info('Unchanged:', path)
+                    return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        Gearoenix.log_info('Written:', path)
+
+    @staticmethod
+    def write_headers():
+        """Writes the generated ids headers, either whole or as a header per module
+        plus an umbrella header that includes all of them"""
+        content = Gearoenix.get_header_file().getvalue()
+        if not Gearoenix.EXPORT_SPLIT_HEADERS:
+            Gearoenix.write_if_changed(Gearoenix.HEADER_PATH, content)
+            return
+        sections = sorted(Gearoenix.header_sections.items(), key=lambda kv: kv[1][0])
+        if Gearoenix.EXPORT_VULKUST:
+            (root, _) = os.path.splitext(Gearoenix.HEADER_PATH)
+            umbrella = ''
+            written = set()
+            for (mod_name, (start, end)) in sections:
+                mod_file = mod_name.lower()
+                mod_path = os.path.join(root, mod_file + '.rs')
+                Gearoenix.write_if_changed(mod_path, content[start:end])
+                written.add(mod_path)
+                umbrella += 'pub mod ' + mod_file + ';\n'
+                umbrella += 'pub use self::' + mod_file + '::' + mod_name + ';\n'
+            Gearoenix.remove_stale_headers(os.path.join(root, ''), '.rs', written)
+        else:
+            umbrella = '#pragma once\n'
+            written = set()
+            for (mod_name, (start, end)) in sections:
+                mod_path = Gearoenix.EXPORT_FILE_PATH + '.' + mod_name.lower() + '.hpp'
+                Gearoenix.write_if_changed(mod_path, '#pragma once\n' + content[start:end])
+                written.add(mod_path)
+                umbrella += '#include "' + os.path.basename(mod_path) + '"\n'
+            Gearoenix.remove_stale_headers(Gearoenix.EXPORT_FILE_PATH + '.', '.hpp', written)
+        Gearoenix.write_if_changed(Gearoenix.HEADER_PATH, umbrella)
+
+    @staticmethod
+    def remove_stale_headers(prefix, suffix, written):
+        """Removes module headers of previous exports, prefix + module + suffix, that are not written now"""
+        directory = os.path.dirname(os.path.abspath(prefix + 'x'))
+        if not os.path.isdir(directory):
+            return
+        written = {os.path.abspath(p) for p in written}
+        written.add(os.path.abspath(Gearoenix.HEADER_PATH))
+        start = os.path.basename(prefix)
+        for file_name in os.listdir(directory):
+            if not file_name.startswith(start) or not file_name.endswith(suffix):
+                continue
+            module = file_name[len(start):len(file_name) - len(suffix)]
+            path = os.path.join(directory, file_name)
+            if len(module) == 0 or not module.isidentifier() or path in written:
+                continue
+            os.remove(path)
+            Gearoenix.log_info('Removed stale header:', path)
 
     @staticmethod
     def find_common_starting(s1, s2):
@@ -309,9 +682,67 @@ class Gearoenix:
                 break
         return s
 
+    @staticmethod
+    def get_ids_file_path():
+        return Gearoenix.EXPORT_FILE_PATH + '.ids.json'
+
+    @staticmethod
+    def load_ids():
+        """Reads the id registry of previous exports, so assets keep their ids"""
+        Gearoenix.last_id = Gearoenix.FIRST_ID
+        Gearoenix.ids = dict()
+        Gearoenix.used_ids = dict()
+        Gearoenix.used_id_keys = set()
+        path = Gearoenix.get_ids_file_path()
+        if not os.path.isfile(path):
+            return
+        with open(path, 'r') as f:
+            registry = json.load(f)
+        Gearoenix.last_id = max(Gearoenix.FIRST_ID, int(registry['last_id']))
+        owners = dict()
+        for (key, item_id) in registry['ids'].items():
+            if item_id in owners:
+                Gearoenix.terminate('Id', item_id, 'is registered for both', owners[item_id],
+                                    'and', key, 'in:', path)
+            if item_id >= Gearoenix.last_id:
+                Gearoenix.terminate('Id', item_id, 'of', key, 'is not below last id in:', path)
+            owners[item_id] = key
+            Gearoenix.ids[key] = item_id
+
+    @staticmethod
+    def allocate_id(kind, name):
+        """Returns the registered id of asset or a fresh one, ids of removed assets are never reused"""
+        key = kind + '/' + name
+        if key in Gearoenix.used_id_keys:
+            Gearoenix.terminate('Asset', key, 'has already an id, its reference name is not unique.')
+        item_id = Gearoenix.ids.get(key)
+        if item_id is None:
+            item_id = Gearoenix.last_id
+            Gearoenix.last_id += 1
+            Gearoenix.ids[key] = item_id
+        if item_id in Gearoenix.used_ids:
+            Gearoenix.terminate('Id', item_id, 'collision between',
+                                Gearoenix.used_ids[item_id], 'and', key)
+        Gearoenix.used_ids[item_id] = key
+        Gearoenix.used_id_keys.add(key)
+        return item_id
+
+    @staticmethod
+    def save_ids():
+        """Writes the registry without the entries of assets that are gone"""
+        ids = {k: i for (k, i) in Gearoenix.ids.items() if i in Gearoenix.used_ids}
+        path = Gearoenix.get_ids_file_path()
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'last_id': Gearoenix.last_id, 'ids': ids}, f, indent=1, sort_keys=True)
+        os.replace(temporary, path)
+
     @staticmethod
     def find_tools():
-        Gearoenix.IBL_BAKER_PATH = os.environ[Gearoenix.IBL_BAKER_ENVIRONMENT_NAME]
+        Gearoenix.IBL_BAKER_PATH = os.environ.get(
+            Gearoenix.IBL_BAKER_ENVIRONMENT_NAME)
+        Gearoenix.REFLECTION_BAKER_PATH = os.environ.get(
+            Gearoenix.REFLECTION_BAKER_ENVIRONMENT_NAME)
 
     class GxTmpFile:
         """A better temporary file"""
@@ -331,28 +762,61 @@ class Gearoenix:
             return d
 
     @staticmethod
-    def create_sky_resources(file: str):
-        baked_cube = Gearoenix.GxTmpFile()
-        irradiance = Gearoenix.GxTmpFile()
+    def create_sky_radiance(file: str):
+        if Gearoenix.IBL_BAKER_PATH is None:
+            Gearoenix.terminate(
+                'Environment variable', Gearoenix.IBL_BAKER_ENVIRONMENT_NAME,
+                'must be set for baking the radiance of:', file)
         radiance = Gearoenix.GxTmpFile()
         subprocess.run(args=[
             Gearoenix.IBL_BAKER_PATH,
             '--environment-file',
             file,
-            '--baked-cube-file',
-            baked_cube.filename,
-            '--baked-cube-resolution',
-            Gearoenix.BAKED_SKYBOX_CUBE_RES,
-            '--irradiance-file',
-            irradiance.filename,
-            '--irradiance-resolution',
-            Gearoenix.IRRADIANCE_RES,
             '--radiance-file',
             radiance.filename,
             '--radiance-resolution',
-            Gearoenix.RADIANCE_RES,
+            str(Gearoenix.PROFILE.radiance_res),
         ], check=True)
-        return (baked_cube, irradiance, radiance)
+        return radiance
+
+    @staticmethod
+    def capture_reflection(scene_name: str, position, resolution: int):
+        """
+        Returns the cube capture of the scene from the position made by the external
+        baker, captures are cached by the saved blend file, position and resolution.
+        """
+        if Gearoenix.REFLECTION_BAKER_PATH is None:
+            Gearoenix.terminate(
+                'Environment variable', Gearoenix.REFLECTION_BAKER_ENVIRONMENT_NAME,
+                'must be set for baking reflection probes of:', scene_name)
+        blend_file = bpy.data.filepath
+        if len(blend_file) == 0 or bpy.data.is_dirty:
+            Gearoenix.terminate('Blend file must be saved before baking reflection probes')
+        key = repr((os.path.abspath(blend_file), os.path.getmtime(blend_file), scene_name,
+                    tuple(round(p, 6) for p in position), resolution))
+        cached = os.path.join(Gearoenix.REFLECTION_CACHE_DIRECTORY,
+                              hashlib.sha1(key.encode('utf-8')).hexdigest())
+        if os.path.isfile(cached):
+            return Gearoenix.read_file(cached)
+        capture = Gearoenix.GxTmpFile()
+        subprocess.run(args=[
+            Gearoenix.REFLECTION_BAKER_PATH,
+            '--blend-file',
+            blend_file,
+            '--scene',
+            scene_name,
+            '--position',
+            ','.join(str(p) for p in position),
+            '--cube-file',
+            capture.filename,
+            '--cube-resolution',
+            str(resolution),
+        ], check=True)
+        data = capture.read()
+        os.makedirs(Gearoenix.REFLECTION_CACHE_DIRECTORY, exist_ok=True)
+        with open(cached, 'wb') as f:
+            f.write(data)
+        return data
 
     @staticmethod
     def menu_func_export(obj, _):
@@ -367,19 +831,64 @@ class Gearoenix:
         except AttributeError:
             return
 
+    @staticmethod
+    def write_header():
+        """
+        Writes the byte order and the last id, header flags are in the upper bits
+        of the byte order byte, so a file without optional features keeps the
+        format of previous versions
+        """
+        Gearoenix.write_u8(int(sys.byteorder == 'little') | (Gearoenix.get_header_flags() << 1))
+        Gearoenix.write_u64(Gearoenix.last_id)
+
+    @staticmethod
+    def get_header_flags():
+        flags = 0
+        if Gearoenix.EXPORT_NAME_HASH:
+            flags |= Gearoenix.HEADER_FLAG_NAME_HASH
+        if Gearoenix.EXPORT_COMPACT:
+            flags |= Gearoenix.HEADER_FLAG_COMPACT
+        return flags
+
+    @staticmethod
+    def get_table_classes():
+        return [
+            Gearoenix.Camera,
+            Gearoenix.Audio,
+            Gearoenix.Light,
+            Gearoenix.Texture,
+            Gearoenix.Font,
+            Gearoenix.Material,
+            Gearoenix.Mesh,
+            Gearoenix.Model,
+            Gearoenix.Reflection,
+            Gearoenix.Skybox,
+            Gearoenix.Constraint,
+            Gearoenix.Scene,
+        ]
+
+    @staticmethod
+    def write_string_pool():
+        """Writes reference names of all tables once, table entries refer to them by offset"""
+        Gearoenix.string_pool = dict()
+        pool = bytearray()
+        for cls in Gearoenix.get_table_classes():
+            for item in cls.instances.values():
+                name = item.get_reference_name()
+                if name in Gearoenix.string_pool:
+                    continue
+                data = name.encode('utf-8')
+                Gearoenix.string_pool[name] = (len(pool), len(data))
+                pool += data
+        Gearoenix.write_varint(len(pool))
+        Gearoenix.GX3D_FILE.write(pool)
+
     @staticmethod
     def write_tables():
-        Gearoenix.Camera.write_table()
-        Gearoenix.Audio.write_table()
-        Gearoenix.Light.write_table()
-        Gearoenix.Texture.write_table()
-        Gearoenix.Font.write_table()
-        Gearoenix.Mesh.write_table()
-        Gearoenix.Model.write_table()
-        Gearoenix.Reflection.write_table()
-        Gearoenix.Skybox.write_table()
-        Gearoenix.Constraint.write_table()
-        Gearoenix.Scene.write_table()
+        if Gearoenix.EXPORT_COMPACT:
+            Gearoenix.write_string_pool()
+        for cls in Gearoenix.get_table_classes():
+            cls.write_table()
 
     @staticmethod
     def export_files():
@@ -389,6 +898,7 @@ class Gearoenix:
         Gearoenix.Camera.init()
         Gearoenix.Texture.init()
         Gearoenix.Font.init()
+        Gearoenix.Material.init()
         Gearoenix.Mesh.init()
         Gearoenix.Model.init()
         Gearoenix.Skybox.init()
@@ -396,15 +906,63 @@ class Gearoenix:
         Gearoenix.Reflection.init()
         Gearoenix.Scene.init()
         Gearoenix.Scene.read_all()
-        Gearoenix.write_bool(sys.byteorder == 'little')
-        Gearoenix.write_id(Gearoenix.last_id)
+        if Gearoenix.EXPORT_ATLAS:
+            Gearoenix.TextureAtlas.create_all()
+        if Gearoenix.EXPORT_INSTANCING:
+            Gearoenix.Scene.instance_all()
+        if Gearoenix.EXPORT_STATIC_BATCHING:
+            Gearoenix.Scene.batch_all()
+        Gearoenix.Material.create_all()
+        Gearoenix.Light.compute_influences()
+        Gearoenix.Reflection.compute_influences()
+        if Gearoenix.EXPORT_PVS:
+            Gearoenix.Scene.bake_pvs_all()
+        if Gearoenix.EXPORT_NAVMESH:
+            Gearoenix.Scene.build_navmesh_all()
+        Gearoenix.Texture.compute_texel_densities()
+        for profile in Gearoenix.EXPORT_PROFILES:
+            Gearoenix.export_profile(profile)
+        Gearoenix.save_ids()
+        Gearoenix.write_headers()
+        if Gearoenix.EXPORT_VULKUST:
+            Gearoenix.RUST_FILE.close()
+        if Gearoenix.EXPORT_GEAROENIX:
+            Gearoenix.CPP_FILE.close()
+        gc.collect()
+
+    @staticmethod
+    def get_profile_file_path(profile):
+        if len(Gearoenix.EXPORT_PROFILES) < 2:
+            return Gearoenix.EXPORT_FILE_PATH
+        (root, extension) = os.path.splitext(Gearoenix.EXPORT_FILE_PATH)
+        return root + '-' + profile.name + extension
+
+    @staticmethod
+    def export_profile(profile):
+        """Writes the already read scenes into the gx3d file of the profile"""
+        Gearoenix.log_info('Exporting profile:', profile.name)
+        Gearoenix.PROFILE = profile
+        Gearoenix.GX3D_FILE = open(
+            Gearoenix.get_profile_file_path(profile), mode='wb')
+        if Gearoenix.EXPORT_VULKUST:
+            Gearoenix.RUST_FILE.seek(0)
+            Gearoenix.RUST_FILE.truncate()
+        if Gearoenix.EXPORT_GEAROENIX:
+            Gearoenix.CPP_FILE.seek(0)
+            Gearoenix.CPP_FILE.truncate()
+        Gearoenix.write_header()
         Gearoenix.tables_offset = Gearoenix.file_tell()
-        Gearoenix.write_tables()
+        if Gearoenix.EXPORT_COMPACT:
+            # Size of tables is known after writing, so they go to the end of file
+            Gearoenix.write_u64(0)
+        else:
+            Gearoenix.write_tables()
         Gearoenix.Camera.write_all()
         Gearoenix.Audio.write_all()
         Gearoenix.Light.write_all()
         Gearoenix.Texture.write_all()
         Gearoenix.Font.write_all()
+        Gearoenix.Material.write_all()
         Gearoenix.Mesh.write_all()
         Gearoenix.Model.write_all()
         Gearoenix.Reflection.write_all()
@@ -412,25 +970,20 @@ class Gearoenix:
         Gearoenix.Constraint.write_all()
         Gearoenix.Scene.write_all()
         Gearoenix.GX3D_FILE.flush()
-        if Gearoenix.EXPORT_VULKUST:
-            Gearoenix.RUST_FILE.flush()
-        if Gearoenix.EXPORT_GEAROENIX:
-            Gearoenix.CPP_FILE.flush()
-        Gearoenix.GX3D_FILE.seek(Gearoenix.tables_offset)
-        if Gearoenix.EXPORT_VULKUST:
-            Gearoenix.RUST_FILE.seek(0)
-        if Gearoenix.EXPORT_GEAROENIX:
-            Gearoenix.CPP_FILE.seek(0)
-        Gearoenix.write_tables()
+        if Gearoenix.EXPORT_COMPACT:
+            tables_offset = Gearoenix.file_tell()
+            Gearoenix.write_tables()
+            Gearoenix.GX3D_FILE.seek(Gearoenix.tables_offset)
+            Gearoenix.write_u64(tables_offset)
+        else:
+            Gearoenix.GX3D_FILE.seek(Gearoenix.tables_offset)
+            if Gearoenix.EXPORT_VULKUST:
+                Gearoenix.RUST_FILE.seek(0)
+            if Gearoenix.EXPORT_GEAROENIX:
+                Gearoenix.CPP_FILE.seek(0)
+            Gearoenix.write_tables()
         Gearoenix.GX3D_FILE.flush()
         Gearoenix.GX3D_FILE.close()
-        if Gearoenix.EXPORT_VULKUST:
-            Gearoenix.RUST_FILE.flush()
-            Gearoenix.RUST_FILE.close()
-        if Gearoenix.EXPORT_GEAROENIX:
-            Gearoenix.CPP_FILE.flush()
-            Gearoenix.CPP_FILE.close()
-        gc.collect()
 
 
 class Asset:
@@ -456,8 +1009,6 @@ class Asset:
         self.instance_type = None
         self.offset = 0
         self.blender_object = blender_object
-        self.instance_id = Gearoenix.last_id
-        Gearoenix.last_id += 1
         self.name = self.__class__.get_name_from_blender_object(
             blender_object)
         if not blender_object.name.startswith(self.__class__.get_prefix()):
@@ -466,8 +1017,32 @@ class Asset:
                 self.__class__.__name__)
         if self.name in self.__class__.instances:
             Gearoenix.terminate(self.name, 'is already in instances.')
+        self.instance_id = Gearoenix.allocate_id(self.get_kind(), self.get_id_key())
+        self.__class__.instances[self.name] = self
+
+    def init_generated(self, name):
+        """Initializes an instance that is made by exporter and has no blender object"""
+        self.instance_type = None
+        self.offset = 0
+        self.blender_object = None
+        self.name = name
+        if self.name in self.__class__.instances:
+            Gearoenix.terminate(self.name, 'is already in instances.')
+        self.instance_id = Gearoenix.allocate_id(self.get_kind(), self.get_id_key())
         self.__class__.instances[self.name] = self
 
+    def get_id_key(self):
+        """Name of asset in id registry, it must not depend on the location of project"""
+        return self.get_reference_name()
+
+    @classmethod
+    def get_kind(cls):
+        """Kind of asset in id registry, subclasses that share a table share a kind"""
+        for c in cls.__mro__:
+            if c.__base__ in (Asset, UniqueAsset, ReferencingAsset):
+                return c.__name__
+        return cls.__name__
+
     @classmethod
     def get_prefix(cls):
         return cls.__name__.lower() + '-'
@@ -527,18 +1102,30 @@ class Asset:
             cls.instances.items(),
             key=lambda kv: kv[1].instance_id)
         common_starting = cls.find_common_starting()
-        Gearoenix.write_u64(len(instances))
+        Gearoenix.write_count(len(instances))
         Gearoenix.log_info('Number of', cls.__name__, len(instances))
+        (previous_id, previous_offset) = (0, 0)
         for _, item in instances:
-            Gearoenix.write_id(item.instance_id)
-            Gearoenix.write_u64(item.offset)
-            Gearoenix.write_string(item.get_reference_name())
+            if Gearoenix.EXPORT_COMPACT:
+                (name_offset, name_length) = Gearoenix.string_pool[item.get_reference_name()]
+                Gearoenix.write_zigzag(item.instance_id - previous_id)
+                Gearoenix.write_zigzag(item.offset - previous_offset)
+                Gearoenix.write_varint(name_offset)
+                Gearoenix.write_varint(name_length)
+                (previous_id, previous_offset) = (item.instance_id, item.offset)
+            else:
+                Gearoenix.write_id(item.instance_id)
+                Gearoenix.write_u64(item.offset)
+                Gearoenix.write_string(item.get_reference_name())
             Gearoenix.log_info(
                 'instance_id:', item.instance_id,
                 'offset:', item.offset,
                 'name:', item.get_reference_name())
             name = Gearoenix.const_string(item.name)[len(common_starting):]
             Gearoenix.write_name_id(name, item.instance_id)
+        if Gearoenix.EXPORT_NAME_HASH:
+            Gearoenix.PerfectHash(
+                [item.get_reference_name() for (_, item) in instances]).write()
         Gearoenix.write_end_module()
 
     @staticmethod
@@ -594,6 +1181,11 @@ class UniqueAsset(Gearoenix.Asset):
                 'This object must not written like this. in', self.name)
         super().write()
 
+    def get_origin(self):
+        if self.origin_instance is None:
+            return self
+        return self.origin_instance
+
     @classmethod
     def read(cls, blender_object):
         if not blender_object.name.startswith(cls.get_prefix()):
@@ -644,11 +1236,28 @@ class ReferencingAsset(Gearoenix.Asset):
                 'This object must not written like this. in', self.name)
         super().write()
 
+    def get_origin(self):
+        if self.origin_instance is None:
+            return self
+        return self.origin_instance
+
     def get_offset(self):
         if self.origin_instance is None:
             return self.offset
         return self.origin_instance.offset
 
+    def get_id_key(self):
+        """Names are paths of referenced files, absolute ones become relative to the blend file"""
+        path = self.name
+        if os.path.isabs(path) and not path.startswith('//'):
+            base = os.path.dirname(bpy.data.filepath) if bpy.data.filepath else \
+                os.path.dirname(Gearoenix.EXPORT_FILE_PATH)
+            try:
+                path = os.path.relpath(path, base)
+            except ValueError:
+                pass  # On another drive
+        return path.replace('\\', '/')
+
 
 Gearoenix.ReferencingAsset = ReferencingAsset
 
@@ -673,6 +1282,24 @@ class Aabb():
         if self.lower.z > v.z:
             self.lower.z = v.z
 
+    def is_empty(self):
+        return self.upper.x < self.lower.x
+
+    def get_corners(self):
+        return [mathutils.Vector((x, y, z))
+                for x in (self.lower.x, self.upper.x)
+                for y in (self.lower.y, self.upper.y)
+                for z in (self.lower.z, self.upper.z)]
+
+    def put_box(self, box, matrix=None):
+        """Puts the other box, after transforming its corners if matrix is given"""
+        if box.is_empty():
+            return
+        for corner in box.get_corners():
+            if matrix is not None:
+                corner = matrix @ corner
+            self.put(corner)
+
     def write(self):
         Gearoenix.write_vector(self.upper)
         Gearoenix.write_vector(self.lower)
@@ -681,10 +1308,339 @@ class Aabb():
 Gearoenix.Aabb = Aabb
 
 
+class Bvh:
+    """
+    Binned SAH bounding volume hierarchy over boxes, flattened in depth-first order.
+    Each node is (lower, upper, first, count), a leaf has count > 0 and covers
+    order[first:first + count], an internal node has count == 0, its left child
+    is the next node and its right child is the node at first.
+    """
+    BINS_COUNT = 16
+    LEAF_SIZE = 2
+    MAX_LEAF_SIZE = 16
+    TRAVERSAL_COST = 1.0
+
+    def __init__(self, lowers, uppers):
+        self.lowers = numpy.array(lowers, dtype=numpy.float64).reshape(-1, 3)
+        self.uppers = numpy.array(uppers, dtype=numpy.float64).reshape(-1, 3)
+        self.order = []
+        self.nodes = []
+        if len(self.lowers) > 0:
+            self.build()
+
+    @staticmethod
+    def get_half_areas(lowers, uppers):
+        d = numpy.maximum(uppers - lowers, 0.0)
+        return d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0]
+
+    def find_split(self, indices, lower, upper):
+        """Returns (axis, position) of the cheapest binned split or None if a leaf is cheaper"""
+        centroids = (self.lowers[indices] + self.uppers[indices]) * 0.5
+        c_min = centroids.min(axis=0)
+        c_extent = centroids.max(axis=0) - c_min
+        parent_area = max(float(self.get_half_areas(lower, upper)), Gearoenix.EPSILON)
+        best = None
+        best_cost = float(len(indices))
+        for axis in range(3):
+            if c_extent[axis] < Gearoenix.EPSILON:
+                continue
+            bins = ((centroids[:, axis] - c_min[axis]) *
+                    (self.BINS_COUNT / c_extent[axis])).astype(numpy.int64)
+            bins = numpy.minimum(bins, self.BINS_COUNT - 1)
+            counts = numpy.bincount(bins, minlength=self.BINS_COUNT)
+            bin_lowers = numpy.full((self.BINS_COUNT, 3), numpy.inf)
+            bin_uppers = numpy.full((self.BINS_COUNT, 3), -numpy.inf)
+            numpy.minimum.at(bin_lowers, bins, self.lowers[indices])
+            numpy.maximum.at(bin_uppers, bins, self.uppers[indices])
+            left_areas = self.get_half_areas(
+                numpy.minimum.accumulate(bin_lowers, axis=0),
+                numpy.maximum.accumulate(bin_uppers, axis=0))[:-1]
+            right_areas = self.get_half_areas(
+                numpy.minimum.accumulate(bin_lowers[::-1], axis=0),
+                numpy.maximum.accumulate(bin_uppers[::-1], axis=0))[::-1][1:]
+            left_counts = numpy.cumsum(counts)[:-1]
+            right_counts = len(indices) - left_counts
+            costs = self.TRAVERSAL_COST + \
+                (left_areas * left_counts + right_areas * right_counts) / parent_area
+            costs[(left_counts == 0) | (right_counts == 0)] = numpy.inf
+            split = int(numpy.argmin(costs))
+            if costs[split] < best_cost:
+                best_cost = float(costs[split])
+                best = (axis, c_min[axis] + c_extent[axis] * (split + 1) / self.BINS_COUNT)
+        if best is None and len(indices) > self.MAX_LEAF_SIZE:
+            axis = int(numpy.argmax(c_extent))
+            if c_extent[axis] >= Gearoenix.EPSILON:
+                best = (axis, float(numpy.median(centroids[:, axis])))
+        return best
+
+    def build(self):
+        stack = [(numpy.arange(len(self.lowers)), None)]
+        while len(stack) > 0:
+            (indices, parent) = stack.pop()
+            if parent is not None:
+                self.nodes[parent][2] = len(self.nodes)
+            lower = self.lowers[indices].min(axis=0)
+            upper = self.uppers[indices].max(axis=0)
+            split = None
+            if len(indices) > self.LEAF_SIZE:
+                split = self.find_split(indices, lower, upper)
+            if split is not None:
+                (axis, position) = split
+                centroids = (self.lowers[indices, axis] + self.uppers[indices, axis]) * 0.5
+                is_left = centroids < position
+                if is_left.all() or not is_left.any():
+                    split = None
+            if split is None:
+                self.nodes.append([lower, upper, len(self.order), len(indices)])
+                self.order.extend(int(i) for i in indices)
+                continue
+            node_index = len(self.nodes)
+            self.nodes.append([lower, upper, 0, 0])
+            stack.append((indices[~is_left], node_index))
+            stack.append((indices[is_left], None))
+
+    def get_leaves(self, predicate):
+        """Yields (first, count) of leaves whose all ancestors and itself pass predicate(lower, upper)"""
+        stack = [0] if len(self.nodes) > 0 else []
+        while len(stack) > 0:
+            node_index = stack.pop()
+            (lower, upper, first, count) = self.nodes[node_index]
+            if not predicate(lower, upper):
+                continue
+            if count > 0:
+                yield (first, count)
+            else:
+                stack.append(first)
+                stack.append(node_index + 1)
+
+    def overlap(self, lower, upper):
+        return self.get_leaves(
+            lambda l, u: (l <= upper).all() and (u >= lower).all())
+
+    def raycast(self, origin, direction, max_distance):
+        """
+        Leaves that the ray can hit, max_distance is a one element list that caller
+        can shrink while iterating to prune farther nodes.
+        """
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / direction
+
+        def predicate(lower, upper):
+            with numpy.errstate(invalid='ignore'):
+                t0 = (lower - origin) * inverse
+                t1 = (upper - origin) * inverse
+            near = numpy.nanmax(numpy.minimum(t0, t1))
+            far = numpy.nanmin(numpy.maximum(t0, t1))
+            return near <= far and far >= 0.0 and near <= max_distance[0]
+        return self.get_leaves(predicate)
+
+    def write(self):
+        Gearoenix.write_count(len(self.nodes))
+        for (lower, upper, first, count) in self.nodes:
+            Gearoenix.write_vector(upper)
+            Gearoenix.write_vector(lower)
+            Gearoenix.write_u32(first)
+            Gearoenix.write_u32(count)
+
+
+Gearoenix.Bvh = Bvh
+
+
+class PerfectHash:
+    """
+    Minimal perfect hash of table names (hash and displace), name to table index in O(1)
+    ...
+    Keys are placed into n buckets by seed 0 hash, then buckets are placed from
+    the largest one, each gets the first seed that puts all of its keys in free
+    slots. Buckets of one key store the free slot directly with the high bit set.
+    Lookup of a name that is not in table gives an arbitrary index, so reader
+    must compare the name in that index of the table.
+    """
+    DIRECT = 0x80000000
+    MAX_SEED = 0x7FFFFFFF
+
+    def __init__(self, names):
+        keys = [n.encode('utf-8') for n in names]
+        if len(set(keys)) != len(keys):
+            Gearoenix.terminate('Perfect hash needs unique names.')
+        count = len(keys)
+        self.displacements = [0] * count
+        self.indices = [0] * count
+        buckets = [[] for _ in range(count)]
+        for (i, k) in enumerate(keys):
+            buckets[PerfectHash.fnv1a(k, 0) % count].append(i)
+        order = sorted(range(count), key=lambda b: -len(buckets[b]))
+        occupied = [False] * count
+        first_single = count
+        for (oi, b) in enumerate(order):
+            bucket = buckets[b]
+            if len(bucket) < 2:
+                first_single = oi
+                break
+            seed = 1
+            while True:
+                slots = [PerfectHash.fnv1a(keys[i], seed) % count for i in bucket]
+                if len(set(slots)) == len(slots) and not any(occupied[s] for s in slots):
+                    break
+                seed += 1
+                if seed > PerfectHash.MAX_SEED:
+                    Gearoenix.terminate('Perfect hash can not place a bucket.')
+            self.displacements[b] = seed
+            for (i, s) in zip(bucket, slots):
+                occupied[s] = True
+                self.indices[s] = i
+        free = [s for s in range(count) if not occupied[s]]
+        for b in order[first_single:]:
+            if len(buckets[b]) == 0:
+                break
+            s = free.pop()
+            self.displacements[b] = PerfectHash.DIRECT | s
+            self.indices[s] = buckets[b][0]
+        for (i, k) in enumerate(keys):
+            if PerfectHash.lookup(k, self.displacements, self.indices) != i:
+                Gearoenix.terminate('Perfect hash does not find', names[i])
+
+    @staticmethod
+    def fnv1a(data, seed):
+        """32-bit FNV-1a, the seed is xored into the offset basis"""
+        h = 0x811C9DC5 ^ seed
+        for b in data:
+            h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+        return h
+
+    @staticmethod
+    def lookup(key, displacements, indices):
+        """Reference reader side lookup, key is utf-8 bytes of name, returns candidate table index"""
+        count = len(displacements)
+        if count == 0:
+            return None
+        d = displacements[PerfectHash.fnv1a(key, 0) % count]
+        if d & PerfectHash.DIRECT != 0:
+            return indices[d & ~PerfectHash.DIRECT]
+        return indices[PerfectHash.fnv1a(key, d) % count]
+
+    @staticmethod
+    def read(f, little_endian=True):
+        """Reads the section that write produced from a binary file object"""
+        order = '<' if little_endian else '>'
+        (count,) = struct.unpack(order + 'I', f.read(4))
+        displacements = list(struct.unpack(order + str(count) + 'I', f.read(4 * count)))
+        indices = list(struct.unpack(order + str(count) + 'I', f.read(4 * count)))
+        return (displacements, indices)
+
+    def write(self):
+        Gearoenix.write_u32(len(self.displacements))
+        for d in self.displacements:
+            Gearoenix.write_u32(d)
+        for i in self.indices:
+            Gearoenix.write_u32(i)
+
+
+Gearoenix.PerfectHash = PerfectHash
+
+
+class CompactReader:
+    """
+    Reference decoder of the header and tables of a gx3d file in compact mode
+    ...
+    Header is the byte order bit with the flags in the upper bits of the same
+    byte, u64 last id and u64 offset of tables. Tables are at the end of file after the string pool, entries are
+    zigzag deltas of id and offset with offset and length of name in the pool.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.little_endian = True
+        self.last_id = None
+        self.flags = 0
+        self.tables_offset = None
+        self.pool = b''
+
+    def read(self, size):
+        result = self.data[self.position:self.position + size]
+        if len(result) != size:
+            Gearoenix.terminate('Unexpected end of gx3d data.')
+        self.position += size
+        return result
+
+    def read_u8(self):
+        return self.read(1)[0]
+
+    def read_u64(self):
+        order = 'little' if self.little_endian else 'big'
+        return int.from_bytes(self.read(8), order)
+
+    def read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            b = self.read_u8()
+            result |= (b & 0x7F) << shift
+            if b & 0x80 == 0:
+                return result
+            shift += 7
+
+    def read_zigzag(self):
+        n = self.read_varint()
+        return (n >> 1) ^ -(n & 1)
+
+    def read_id(self):
+        return self.read_varint()
+
+    def read_ids(self):
+        """Reads what Gearoenix.write_ids writes in compact mode"""
+        ids = []
+        previous = 0
+        for _ in range(self.read_varint()):
+            previous += self.read_zigzag()
+            ids.append(previous)
+        return ids
+
+    def read_header(self):
+        self.position = 0
+        first = self.read_u8()
+        self.little_endian = first & 1 != 0
+        self.flags = first >> 1
+        self.last_id = self.read_u64()
+        if self.flags & Gearoenix.HEADER_FLAG_COMPACT == 0:
+            Gearoenix.terminate('Data is not in compact mode.')
+        self.tables_offset = self.read_u64()
+
+    def read_tables(self):
+        """Returns tables in file order, each one is a list of (id, offset, name)"""
+        self.read_header()
+        self.position = self.tables_offset
+        self.pool = self.read(self.read_varint())
+        tables = []
+        for _ in Gearoenix.get_table_classes():
+            table = []
+            (item_id, offset) = (0, 0)
+            for _ in range(self.read_varint()):
+                item_id += self.read_zigzag()
+                offset += self.read_zigzag()
+                name_offset = self.read_varint()
+                name = self.pool[name_offset:name_offset + self.read_varint()]
+                table.append((item_id, offset, name.decode('utf-8')))
+            if self.flags & Gearoenix.HEADER_FLAG_NAME_HASH != 0:
+                Gearoenix.PerfectHash.read(self, self.little_endian)
+            tables.append(table)
+        return tables
+
+
+Gearoenix.CompactReader = CompactReader
+
+
 class Audio(Gearoenix.ReferencingAsset):
     TYPE_MUSIC = 1
     TYPE_OBJECT = 2
 
+    CODEC_VORBIS = 1
+    CODEC_OPUS = 2
+
+    OPUS_RATE = 48000
+    SEEK_INTERVAL = 0.25
+
     @classmethod
     def init(cls):
         super().init()
@@ -693,17 +1649,68 @@ class Audio(Gearoenix.ReferencingAsset):
 
     def __init__(self, blender_object):
         super().__init__(blender_object)
-        if blender_object.startswith(self.MUSIC_PREFIX):
+        if blender_object.name.startswith(self.MUSIC_PREFIX):
             self.instance_type = self.TYPE_MUSIC
-        elif blender_object.startswith(self.OBJECT_PREFIX):
+        elif blender_object.name.startswith(self.OBJECT_PREFIX):
             self.instance_type = self.TYPE_OBJECT
         else:
             Gearoenix.terminate('Unspecified type in:', blender_object.name)
         self.file = Gearoenix.read_file(self.name)
+        self.parse_ogg()
+
+    def parse_ogg(self):
+        """Reads stream header and builds seek table of (granule position, page byte offset)"""
+        data = self.file
+        pages = []
+        serial = None
+        first_packet = None
+        offset = 0
+        while offset + 27 <= len(data):
+            if data[offset:offset + 4] != b'OggS':
+                Gearoenix.terminate('Corrupted Ogg page in audio:', self.name, 'at', offset)
+            (granule, page_serial) = struct.unpack_from('<QI', data, offset + 6)
+            segments_count = data[offset + 26]
+            segments = data[offset + 27:offset + 27 + segments_count]
+            body = offset + 27 + segments_count
+            if serial is None:
+                serial = page_serial
+                first_packet = data[body:body + segments[0]] if segments_count > 0 else b''
+            if page_serial == serial and granule != 0xFFFFFFFFFFFFFFFF:
+                pages.append((granule, offset))
+            offset = body + sum(segments)
+        if first_packet is None:
+            Gearoenix.terminate('Empty Ogg file in audio:', self.name)
+        if first_packet.startswith(b'\x01vorbis'):
+            self.codec = self.CODEC_VORBIS
+            (self.channels, self.rate) = struct.unpack_from('<BI', first_packet, 11)
+            self.pre_skip = 0
+        elif first_packet.startswith(b'OpusHead'):
+            self.codec = self.CODEC_OPUS
+            (self.channels, self.pre_skip) = struct.unpack_from('<BH', first_packet, 9)
+            self.rate = self.OPUS_RATE
+        else:
+            Gearoenix.terminate('Only Vorbis and Opus streams are supported in audio:', self.name)
+        last_granule = pages[-1][0] if len(pages) > 0 else 0
+        self.duration = max(last_granule - self.pre_skip, 0) / float(self.rate)
+        interval = int(self.SEEK_INTERVAL * self.rate)
+        self.seek_table = []
+        for (granule, page_offset) in pages:
+            if len(self.seek_table) == 0 or granule - self.seek_table[-1][0] >= interval:
+                self.seek_table.append((granule, page_offset))
 
     def write(self):
         super().write()
         Gearoenix.write_file(self.file)
+        Gearoenix.write_u8(self.codec)
+        Gearoenix.write_u8(self.channels)
+        Gearoenix.write_u32(self.rate)
+        Gearoenix.write_u16(self.pre_skip)
+        Gearoenix.write_double(self.duration)
+        if self.instance_type == self.TYPE_MUSIC:
+            Gearoenix.write_count(len(self.seek_table))
+            for (granule, page_offset) in self.seek_table:
+                Gearoenix.write_u64(granule)
+                Gearoenix.write_u64(page_offset)
 
     @staticmethod
     def get_name_from_blender_object(blender_object):
@@ -758,6 +1765,39 @@ class Light(Gearoenix.Asset):
             self.instance_type = self.TYPE_POINT
         else:
             Gearoenix.terminate('Unspecified type in:', blender_object.name)
+        self.models = []
+
+    def get_range(self):
+        """Distance that inverse square falloff brings the strongest channel down to the cutoff"""
+        color = self.blender_object.data.color
+        strength = max(color[0], color[1], color[2]) * self.blender_object.data.energy
+        return math.sqrt(max(strength, 0.0) / Gearoenix.LIGHT_CUTOFF)
+
+    def touches(self, box):
+        if box.is_empty():
+            return False
+        center = self.blender_object.matrix_world.translation
+        distance = 0.0
+        for i in range(3):
+            d = max(box.lower[i] - center[i], 0.0, center[i] - box.upper[i])
+            distance += d * d
+        return distance <= self.get_range() ** 2
+
+    @classmethod
+    def compute_influences(cls):
+        """Links point lights with the static models and instance groups that they reach"""
+        for scene in Gearoenix.Scene.instances.values():
+            for light in scene.lights:
+                if light.instance_type != cls.TYPE_POINT:
+                    continue
+                for model in scene.get_all_models():
+                    if model.instance_type == model.TYPE_STATIC and \
+                            light.touches(model.get_world_box()):
+                        light.models.append(model)
+                        model.lights.append(light)
+                for group in scene.instance_groups:
+                    if light.touches(group.get_box()):
+                        group.lights.append(light)
 
     def write(self):
         super().write()
@@ -768,7 +1808,9 @@ class Light(Gearoenix.Asset):
         Gearoenix.write_float(color[2] * strength)
         Gearoenix.write_bool(self.blender_object.data.use_shadow)
         if self.instance_type == self.TYPE_POINT:
-            Gearoenix.write_vector(self.blender_object.location)
+            Gearoenix.write_vector(self.blender_object.matrix_world.translation)
+            Gearoenix.write_float(self.get_range())
+            Gearoenix.write_instances_ids(self.models)
         elif self.instance_type == self.TYPE_DIRECTIONAL:
             v = self.blender_object.matrix_world @ mathutils.Vector(
                 (0.0, 0.0, -1.0, 0.0))
@@ -810,10 +1852,10 @@ class Camera(Gearoenix.Asset):
     def write(self):
         super().write()
         cam = self.blender_object.data
-        Gearoenix.write_vector(self.blender_object.location)
+        Gearoenix.write_vector(self.blender_object.matrix_world.translation)
         Gearoenix.log_info(
             "Camera location is:",
-            str(self.blender_object.location))
+            str(self.blender_object.matrix_world.translation))
         Gearoenix.write_vector(
             self.blender_object.matrix_world.to_quaternion(), 4)
         Gearoenix.log_info("Camera quaternion is:",
@@ -941,12 +1983,14 @@ Gearoenix.Constraint = Constraint
 class Collider:
     GHOST = 1
     MESH = 2
+    CONVEX = 3
     PREFIX = 'collider-'
     CHILDREN = []
 
     def __init__(self, blender_object=None):
         if blender_object is None:
-            if self.MY_TYPE == self.GHOST:
+            if self.MY_TYPE == self.GHOST or self.MY_TYPE == self.CONVEX:
+                self.blender_object = None
                 return
             else:
                 Gearoenix.terminate('Unexpected blender_object is None')
@@ -958,6 +2002,10 @@ class Collider:
     def write(self):
         Gearoenix.write_type_id(self.MY_TYPE)
 
+    def attach(self, model):
+        """Called when the owner model is completely read"""
+        pass
+
     @classmethod
     def read(cls, pb_obj):
         collider_object = None
@@ -995,36 +2043,355 @@ class MeshCollider(Gearoenix.Collider):
         if blender_object.type != 'MESH':
             Gearoenix.terminate(
                 'Mesh collider must have mesh object type, In model:', blender_object.name)
-        if has_transformation(blender_object):
+        if Gearoenix.has_transformation(blender_object):
             Gearoenix.terminate(
                 'Mesh collider can not have any transformation, in:', blender_object.name)
         msh = blender_object.data
-        self.indices = []
-        self.vertices = msh.vertices
+        triangles = []
         for p in msh.polygons:
             if len(p.vertices) > 3:
                 Gearoenix.terminate('Object', blender_object.name,
                                     'is not triangulated!')
-            for i in p.vertices:
-                self.indices.append(i)
+            triangles.append(tuple(p.vertices))
+        self.init_triangles([tuple(v.co) for v in msh.vertices], triangles)
+
+    def init_triangles(self, vertices, triangles):
+        """Builds the triangle BVH and reorders triangles so every leaf covers a contiguous range"""
+        self.vertices = numpy.array(vertices, dtype=numpy.float64).reshape(-1, 3)
+        triangles = numpy.array(triangles, dtype=numpy.int64).reshape(-1, 3)
+        corners = self.vertices[triangles]
+        self.bvh = Gearoenix.Bvh(corners.min(axis=1), corners.max(axis=1))
+        self.triangles = triangles[numpy.array(self.bvh.order, dtype=numpy.int64)]
+
+    def raycast(self, origin, direction, max_distance=float('inf')):
+        """Reference query of engine, returns (distance, triangle index) of the nearest hit or None"""
+        origin = numpy.array(origin, dtype=numpy.float64)
+        direction = numpy.array(direction, dtype=numpy.float64)
+        best = None
+        max_distance = [max_distance]
+        for first, count in self.bvh.raycast(origin, direction, max_distance):
+            for t in range(first, first + count):
+                (a, b, c) = self.vertices[self.triangles[t]]
+                distance = self.intersect_triangle(origin, direction, a, b, c)
+                if distance is not None and distance <= max_distance[0]:
+                    max_distance[0] = distance
+                    best = (distance, t)
+        return best
+
+    def overlap(self, lower, upper):
+        """Reference query of engine, returns indices of triangles whose boxes overlap the box"""
+        result = []
+        for first, count in self.bvh.overlap(lower, upper):
+            for t in range(first, first + count):
+                corners = self.vertices[self.triangles[t]]
+                if (corners.min(axis=0) <= upper).all() and (corners.max(axis=0) >= lower).all():
+                    result.append(t)
+        return result
+
+    @staticmethod
+    def intersect_triangle(origin, direction, a, b, c):
+        """Moller-Trumbore, returns distance along direction or None"""
+        e1 = b - a
+        e2 = c - a
+        p = numpy.cross(direction, e2)
+        det = numpy.dot(e1, p)
+        if abs(det) < 1e-12:
+            return None
+        inv_det = 1.0 / det
+        s = origin - a
+        u = numpy.dot(s, p) * inv_det
+        if u < 0.0 or u > 1.0:
+            return None
+        q = numpy.cross(s, e1)
+        v = numpy.dot(direction, q) * inv_det
+        if v < 0.0 or u + v > 1.0:
+            return None
+        t = numpy.dot(e2, q) * inv_det
+        if t < 0.0:
+            return None
+        return float(t)
 
     def write(self):
         super().write()
-        Gearoenix.write_u64(len(self.vertices))
+        Gearoenix.write_count(len(self.vertices))
         for v in self.vertices:
-            Gearoenix.write_vector(v.co)
-        Gearoenix.write_u32_array(self.indices)
+            Gearoenix.write_vector(v)
+        Gearoenix.write_u32_array(self.triangles.flatten())
+        self.bvh.write()
 
 
 Gearoenix.MeshCollider = MeshCollider
 Gearoenix.Collider.CHILDREN.append(Gearoenix.MeshCollider)
 
 
+class ConvexCollider(Gearoenix.Collider):
+    """
+    Set of convex hulls in the model space, it is the hull of its own mesh object
+    if it has one, otherwise the meshes of the model are used. Concave shapes are
+    approximately decomposed by recursively splitting their surface samples with
+    axis aligned planes.
+    """
+    MY_TYPE = Gearoenix.Collider.CONVEX
+    PREFIX = Gearoenix.Collider.PREFIX + 'convex-'
+
+    MAX_VERTICES = 64
+    MAX_HULLS = 16
+    CONCAVITY = 0.1
+    SAMPLES_COUNT = 2048
+    SPLIT_POSITIONS = (0.25, 0.5, 0.75)
+
+    def __init__(self, blender_object=None):
+        super().__init__(blender_object)
+        self.hulls = []
+        if blender_object is None or blender_object.type != 'MESH':
+            return
+        if Gearoenix.has_transformation(blender_object):
+            Gearoenix.terminate(
+                'Convex collider can not have any transformation, in:', blender_object.name)
+        msh = blender_object.data
+        points = numpy.array([tuple(v.co) for v in msh.vertices], dtype=numpy.float64)
+        triangles = []
+        for p in msh.polygons:
+            for i in range(1, len(p.vertices) - 1):
+                triangles.append((p.vertices[0], p.vertices[i], p.vertices[i + 1]))
+        self.decompose(points[numpy.array(triangles, dtype=numpy.int64).reshape(-1, 3)],
+                       blender_object.name)
+
+    def attach(self, model):
+        if len(self.hulls) > 0:
+            return
+        triangles = []
+        for mesh in model.meshes:
+            (positions, _, indices) = mesh.get_origin().get_arrays()
+            triangles.append(positions[indices])
+        if len(triangles) < 1:
+            Gearoenix.terminate('Convex collider needs a mesh, in model:', model.name)
+        self.decompose(numpy.concatenate(triangles), model.name)
+
+    def decompose(self, triangles, owner_name):
+        """
+        triangles is an (n, 3, 3) array of corners. The part with the most profitable
+        split is split until gains vanish or, for closed shapes, until hulls are close
+        enough to the solid volume. owner_name is only for error messages.
+        """
+        if len(triangles) < 1:
+            Gearoenix.terminate('Convex collider can not be empty, in:', owner_name)
+        solid_volume = self.get_solid_volume(triangles)
+        parts = []
+
+        def add_part(points):
+            hull = self.quickhull(points)
+            volume = self.get_volume(*hull)
+            parts.append([points, hull, volume, None, volume])
+
+        add_part(self.sample_surface(triangles))
+        while len(parts) < self.MAX_HULLS:
+            total_volume = sum(p[2] for p in parts)
+            if total_volume <= solid_volume * (1.0 + self.CONCAVITY):
+                break
+            for p in parts:
+                if p[3] is None:
+                    (p[3], p[4]) = self.find_split(p[0])
+            index = max(range(len(parts)), key=lambda i: parts[i][2] - parts[i][4])
+            best = parts[index]
+            gain = best[2] - best[4]
+            if gain <= 0.0 or (solid_volume <= 0.0 and gain < best[2] * self.CONCAVITY):
+                break
+            del parts[index]
+            add_part(best[3][0])
+            add_part(best[3][1])
+        self.hulls = [self.reduce(*p[1]) for p in parts]
+
+    @staticmethod
+    def get_solid_volume(triangles):
+        """Volume of the shape if it is closed, otherwise zero"""
+        corners = numpy.round(triangles.reshape(-1, 3), 6)
+        (_, ids) = numpy.unique(corners, axis=0, return_inverse=True)
+        ids = ids.reshape(-1, 3)
+        edges = numpy.concatenate((ids[:, (0, 1)], ids[:, (1, 2)], ids[:, (2, 0)]))
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        (_, counts) = numpy.unique(numpy.sort(edges, axis=1), axis=0, return_counts=True)
+        if len(counts) < 1 or (counts != 2).any():
+            return 0.0
+        volume = numpy.einsum('ij,ij->i', triangles[:, 0], numpy.cross(triangles[:, 1], triangles[:, 2]))
+        return abs(float(volume.sum())) / 6.0
+
+    @classmethod
+    def sample_surface(cls, triangles):
+        """Corners plus area weighted deterministic samples of the triangles"""
+        e1 = triangles[:, 1] - triangles[:, 0]
+        e2 = triangles[:, 2] - triangles[:, 0]
+        areas = numpy.linalg.norm(numpy.cross(e1, e2), axis=1)
+        samples = [triangles.reshape(-1, 3)]
+        if areas.sum() > 0.0:
+            random = numpy.random.default_rng(0)
+            chosen = random.choice(len(triangles), cls.SAMPLES_COUNT, p=areas / areas.sum())
+            (u, v) = random.random((2, cls.SAMPLES_COUNT))
+            flip = u + v > 1.0
+            u[flip] = 1.0 - u[flip]
+            v[flip] = 1.0 - v[flip]
+            samples.append(triangles[chosen, 0] + e1[chosen] * u[:, None] + e2[chosen] * v[:, None])
+        return numpy.unique(numpy.concatenate(samples), axis=0)
+
+    def find_split(self, points):
+        """Returns the two halves with the smallest sum of hull volumes and that sum"""
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        best = None
+        best_volume = float('inf')
+        for axis in range(3):
+            for f in self.SPLIT_POSITIONS:
+                position = lower[axis] + (upper[axis] - lower[axis]) * f
+                is_left = points[:, axis] < position
+                left = points[is_left]
+                right = points[~is_left]
+                if len(left) < 4 or len(right) < 4:
+                    continue
+                split_volume = self.get_volume(*self.quickhull(left)) + \
+                    self.get_volume(*self.quickhull(right))
+                if split_volume < best_volume:
+                    best_volume = split_volume
+                    best = (left, right)
+        return (best, best_volume)
+
+    @staticmethod
+    def get_volume(vertices, triangles):
+        center = vertices.mean(axis=0)
+        t = vertices[triangles] - center
+        return abs(float(numpy.einsum('ij,ij->i', t[:, 0], numpy.cross(t[:, 1], t[:, 2])).sum())) / 6.0
+
+    @classmethod
+    def reduce(cls, vertices, triangles):
+        """Caps vertices of the hull by keeping the farthest spread ones and rebuilding it"""
+        if len(vertices) <= cls.MAX_VERTICES:
+            return (vertices, triangles)
+        center = vertices.mean(axis=0)
+        kept = [int(numpy.argmax(numpy.linalg.norm(vertices - center, axis=1)))]
+        distances = numpy.linalg.norm(vertices - vertices[kept[0]], axis=1)
+        while len(kept) < cls.MAX_VERTICES:
+            i = int(numpy.argmax(distances))
+            kept.append(i)
+            distances = numpy.minimum(distances, numpy.linalg.norm(vertices - vertices[i], axis=1))
+        return cls.quickhull(vertices[kept])
+
+    @staticmethod
+    def quickhull(points):
+        """Returns (vertices, triangles) of the convex hull, triangles are counter clockwise from outside"""
+        points = numpy.unique(numpy.array(points, dtype=numpy.float64).reshape(-1, 3), axis=0)
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        epsilon = max(float((upper - lower).max()), 1.0) * 1e-9
+        a = int(numpy.argmin(points[:, 0]))
+        b = int(numpy.argmax(numpy.linalg.norm(points - points[a], axis=1)))
+        ab = points[b] - points[a]
+        c = int(numpy.argmax(numpy.linalg.norm(numpy.cross(points - points[a], ab), axis=1)))
+        normal = numpy.cross(ab, points[c] - points[a])
+        heights = (points - points[a]) @ normal
+        d = int(numpy.argmax(numpy.abs(heights)))
+        if abs(heights[d]) <= epsilon * max(numpy.linalg.norm(normal), epsilon):
+            # Flat or degenerate, hull of its slightly inflated box is used.
+            extent = numpy.maximum(upper - lower, Gearoenix.EPSILON) * 0.5
+            center = (upper + lower) * 0.5
+            points = numpy.array([center + extent * (x, y, z)
+                                  for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)])
+            return ConvexCollider.quickhull(points)
+        if heights[d] > 0.0:
+            (b, c) = (c, b)
+        vertices = []
+        # Planes are kept in (nx, ny, nz, -offset) rows, dead faces get a plane that nothing is above
+        planes = numpy.zeros((64, 4))
+        outsides = []
+        pending = []
+
+        def add_face(i, j, k, candidates):
+            nonlocal planes
+            n = numpy.cross(points[j] - points[i], points[k] - points[i])
+            n /= numpy.linalg.norm(n)
+            offset = float(n @ points[i])
+            outside = candidates[points[candidates] @ n - offset > epsilon]
+            if len(vertices) == len(planes):
+                planes = numpy.concatenate((planes, numpy.zeros(planes.shape)))
+            planes[len(vertices)] = (n[0], n[1], n[2], -offset)
+            vertices.append((i, j, k))
+            outsides.append(outside)
+            if len(outside) > 0:
+                pending.append(len(vertices) - 1)
+            return outside
+
+        everything = numpy.arange(len(points))
+        for f in ((a, b, c), (a, d, b), (b, d, c), (c, d, a)):
+            add_face(*f, everything)
+        while len(pending) > 0:
+            face = pending.pop()
+            if outsides[face] is None:
+                continue
+            outside = outsides[face]
+            apex = int(outside[numpy.argmax(points[outside] @ planes[face, :3])])
+            visible = numpy.nonzero(
+                planes[:len(vertices), :3] @ points[apex] + planes[:len(vertices), 3] > epsilon)[0]
+            edges = set()
+            for f in visible:
+                (i, j, k) = vertices[f]
+                edges.update(((i, j), (j, k), (k, i)))
+            candidates = numpy.concatenate([outsides[f] for f in visible])
+            candidates = candidates[candidates != apex]
+            for f in visible:
+                outsides[f] = None
+                planes[f] = (0.0, 0.0, 0.0, -1.0)
+            for (i, j) in edges:
+                if (j, i) in edges:
+                    continue
+                # Every outside point belongs only to one face
+                outside = add_face(i, j, apex, candidates)
+                if len(outside) > 0:
+                    candidates = numpy.setdiff1d(candidates, outside, assume_unique=True)
+        faces = numpy.array([v for (v, o) in zip(vertices, outsides) if o is not None], dtype=numpy.int64)
+        used = numpy.unique(faces)
+        remap = numpy.full(len(points), -1, dtype=numpy.int64)
+        remap[used] = numpy.arange(len(used))
+        return (points[used], remap[faces])
+
+    def write(self):
+        super().write()
+        Gearoenix.write_count(len(self.hulls))
+        for (vertices, triangles) in self.hulls:
+            Gearoenix.write_count(len(vertices))
+            for v in vertices:
+                Gearoenix.write_vector(v)
+            Gearoenix.write_u32_array(triangles.flatten())
+
+
+Gearoenix.ConvexCollider = ConvexCollider
+Gearoenix.Collider.CHILDREN.append(Gearoenix.ConvexCollider)
+
+
 class Texture(Gearoenix.ReferencingAsset):
     TYPE_2D = 1
     TYPE_3D = 2
     TYPE_CUBE = 3
 
+    ENCODING_PNG = 1
+    ENCODING_RAW = 2
+    # Source JPEG files that need no processing, only as pass through
+    ENCODING_JPEG = 3
+    # BC1 blocks for up to three stored channels, BC3 blocks for four
+    ENCODING_BC = 4
+
+    MIPS_NONE = 1
+    MIPS_RUNTIME = 2
+    MIPS_BAKED = 3
+
+    # Values of engine render::texture::TextureFormat, the floating point
+    # formats are 1 to 12 and the 8 bit formats follow them
+    FORMAT_RGBA_UINT8 = 13  # TextureFormat::RgbaUint8
+    FORMAT_RGB_UINT8 = 14  # TextureFormat::RgbUint8
+    FORMAT_RG_UINT8 = 15  # TextureFormat::RgUint8
+    FORMAT_R_UINT8 = 16  # TextureFormat::Uint8
+
+    CHANNEL_CONSTANT = 255
+
+    FACES = ('up', 'down', 'left', 'right', 'front', 'back')
+
     @classmethod
     def init(cls):
         super().init()
@@ -1042,23 +2409,18 @@ class Texture(Gearoenix.ReferencingAsset):
                 'cube texture file name must ends with',
                 '-[face-name](up/down/left/right/front/back).[extension]')
         prefix = up_prefix[:len(up_prefix) - 3]
-        self.img_up = Gearoenix.read_file(self.name)
-        self.img_down = Gearoenix.read_file(prefix + '-down' + extension)
-        self.img_left = Gearoenix.read_file(prefix + '-left' + extension)
-        self.img_right = Gearoenix.read_file(prefix + '-right' + extension)
-        self.img_front = Gearoenix.read_file(prefix + '-front' + extension)
-        self.img_back = Gearoenix.read_file(prefix + '-back' + extension)
-
-    def write_6_face(self):
-        Gearoenix.write_file(self.img_up)
-        Gearoenix.write_file(self.img_down)
-        Gearoenix.write_file(self.img_left)
-        Gearoenix.write_file(self.img_right)
-        Gearoenix.write_file(self.img_front)
-        Gearoenix.write_file(self.img_back)
+        self.face_files = [prefix + '-' + f + extension for f in self.FACES]
+        self.faces = [Gearoenix.read_file(f) for f in self.face_files]
 
     def __init__(self, blender_object):
         super().__init__(blender_object)
+        self.roles = set()
+        self.blend_uses = set()
+        self.texel_density = 0.0
+        self.scene_mips = dict()
+        self.pixels = None
+        self.packing = None
+        self.levels_cache = dict()
         if blender_object.name.startswith(self.D2_PREFIX):
             self.file = Gearoenix.read_file(self.name)
             self.instance_type = self.TYPE_2D
@@ -1072,23 +2434,248 @@ class Texture(Gearoenix.ReferencingAsset):
             Gearoenix.terminate(
                 'Unspecified texture type, in:', blender_object.name)
 
+    def add_role(self, role):
+        if self.origin_instance is not None:
+            self.origin_instance.add_role(role)
+        else:
+            self.roles.add(role)
+
+    def add_blend_use(self, is_blend):
+        if self.origin_instance is not None:
+            self.origin_instance.add_blend_use(is_blend)
+        else:
+            self.blend_uses.add(is_blend)
+
+    def get_used_channels(self):
+        """RGBA channels that are read by the roles of texture"""
+        roles = self.roles
+        if self.instance_type == self.TYPE_CUBE:
+            roles = {Gearoenix.Profile.ROLE_CUBE}
+        elif len(roles) < 1:
+            roles = {Gearoenix.Profile.ROLE_COLOR}
+        used = set()
+        for role in roles:
+            if role == Gearoenix.Profile.ROLE_COLOR:
+                used |= {0, 1, 2, 3}
+            elif role == Gearoenix.Profile.ROLE_METALLIC_ROUGHNESS:
+                used |= {1, 2}  # roughness in green, metallic in blue
+            else:
+                used |= {0, 1, 2}
+        return used
+
+    def analyze(self):
+        """
+        Scans the decoded images and keeps only the channels that carry data.
+        Returns (format, premultiplied, swizzle, packed images), in swizzle
+        each RGBA channel is (stored channel index, 0) or (CHANNEL_CONSTANT, value).
+        """
+        if self.packing is not None:
+            return self.packing
+        images = self.decode()
+        texels = numpy.concatenate([i.reshape((-1, 4)) for i in images])
+        premultiplied = self.blend_uses == {True} and \
+            texels[:, 3].min() != texels[:, 3].max()
+        if premultiplied:
+            images = [numpy.concatenate((
+                ((i[:, :, :3].astype(numpy.uint16) * i[:, :, 3:] + 127) //
+                 255).astype(numpy.uint8), i[:, :, 3:]), axis=2)
+                for i in images]
+            texels = numpy.concatenate([i.reshape((-1, 4)) for i in images])
+        used = self.get_used_channels()
+        lower = texels.min(axis=0)
+        upper = texels.max(axis=0)
+        stored = []
+        swizzle = []
+        for c in range(4):
+            if c not in used:
+                swizzle.append((self.CHANNEL_CONSTANT, 0))
+                continue
+            if lower[c] == upper[c]:
+                swizzle.append((self.CHANNEL_CONSTANT, int(lower[c])))
+                continue
+            for i, s in enumerate(stored):
+                if numpy.array_equal(texels[:, c], texels[:, s]):
+                    swizzle.append((i, 0))
+                    break
+            else:
+                swizzle.append((len(stored), 0))
+                stored.append(c)
+        if len(stored) < 1:
+            packed = [i[:1, :1, :1] for i in images]
+        else:
+            packed = [numpy.ascontiguousarray(i[:, :, stored]) for i in images]
+        texture_format = {
+            1: self.FORMAT_R_UINT8,
+            2: self.FORMAT_RG_UINT8,
+            3: self.FORMAT_RGB_UINT8,
+            4: self.FORMAT_RGBA_UINT8,
+        }[packed[0].shape[2]]
+        self.packing = (texture_format, premultiplied, swizzle, packed)
+        return self.packing
+
+    def get_passthrough_encoding(self):
+        """Encoding of the source files if they hold exactly the packed channels, otherwise None"""
+        (_, premultiplied, swizzle, packed) = self.analyze()
+        channels = packed[0].shape[2]
+        if premultiplied or swizzle[:channels] != [(i, 0) for i in range(channels)]:
+            return None
+        encodings = set()
+        for img in self.get_images():
+            if Gearoenix.get_image_channels(img) != channels:
+                return None
+            encodings.add(self.ENCODING_PNG if Gearoenix.is_png(img) else self.ENCODING_JPEG)
+        if len(encodings) != 1:
+            return None
+        return encodings.pop()
+
+    def get_quality(self):
+        """The most demanding quality of the texture roles in the current profile"""
+        textures = Gearoenix.PROFILE.textures
+        if self.instance_type == self.TYPE_CUBE:
+            return textures[Gearoenix.Profile.ROLE_CUBE]
+        roles = self.roles
+        if len(roles) < 1:
+            roles = {Gearoenix.Profile.ROLE_COLOR}
+        return max((textures[r] for r in roles), key=lambda q: q.max_resolution)
+
+    def get_image_files(self):
+        if self.instance_type == self.TYPE_CUBE:
+            return self.face_files
+        return [self.name]
+
+    def get_images(self):
+        if self.instance_type == self.TYPE_CUBE:
+            return self.faces
+        return [self.file]
+
+    def decode(self):
+        """Decodes the images once, the result is shared between all profiles"""
+        if self.pixels is None:
+            self.pixels = [Gearoenix.read_image_bytes(f)
+                           for f in self.get_image_files()]
+        return self.pixels
+
+    def get_image_sizes(self):
+        """(width, height) of every image, taken from decoded pixels so it works for any format"""
+        return [(p.shape[1], p.shape[0]) for p in self.decode()]
+
+    def encode_level(self, pixels, quality):
+        if quality.encoding == self.ENCODING_RAW:
+            return pixels.tobytes()
+        if quality.encoding == self.ENCODING_PNG:
+            return Gearoenix.encode_png(pixels)
+        if quality.encoding == self.ENCODING_BC:
+            return Gearoenix.encode_bc(pixels)
+        Gearoenix.terminate('Unexpected texture encoding in:', self.name)
+
+    def get_levels(self, quality):
+        """
+        Returns (encoding, levels), levels are (width, height, data) of the mip levels
+        of every image. Source PNG and JPEG files are written as they are when a
+        file encoding is asked and they need no repacking, resizing or baked mips.
+        """
+        key = (quality.max_resolution, quality.encoding, quality.mips)
+        if key in self.levels_cache:
+            return self.levels_cache[key]
+        images = self.get_images()
+        sizes = self.get_image_sizes()
+        encoding = quality.encoding
+        passthrough = None
+        if quality.encoding == self.ENCODING_PNG and \
+                quality.mips != self.MIPS_BAKED and \
+                max(max(s) for s in sizes) <= quality.max_resolution:
+            passthrough = self.get_passthrough_encoding()
+        if passthrough is not None:
+            encoding = passthrough
+            levels = [[(s[0], s[1], img)] for s, img in zip(sizes, images)]
+        else:
+            levels = []
+            for pixels in self.analyze()[3]:
+                while max(pixels.shape[:2]) > quality.max_resolution:
+                    pixels = Gearoenix.downsample_image(pixels)
+                image_levels = [pixels]
+                if quality.mips == self.MIPS_BAKED:
+                    while max(image_levels[-1].shape[:2]) > 1:
+                        image_levels.append(
+                            Gearoenix.downsample_image(image_levels[-1]))
+                levels.append([
+                    (p.shape[1], p.shape[0], self.encode_level(p, quality))
+                    for p in image_levels])
+        self.levels_cache[key] = (encoding, levels)
+        return (encoding, levels)
+
+    @classmethod
+    def compute_texel_densities(cls):
+        """Finds the finest mip level that each scene needs from each 2D texture"""
+        for scene in Gearoenix.Scene.instances.values():
+            pixels_per_unit = scene.get_pixels_per_unit()
+            for (model, mesh) in scene.get_placed_meshes():
+                matrix = Gearoenix.to_numpy_matrix(model.matrix)
+                uv_density = mesh.get_origin().get_uv_density(matrix)
+                if uv_density <= 0.0:
+                    continue
+                for texture in mesh.mat.get_textures():
+                    texture = texture.get_origin()
+                    if texture.instance_type != cls.TYPE_2D:
+                        continue
+                    (width, height) = texture.get_image_sizes()[0]
+                    density = uv_density * math.sqrt(width * height)
+                    texture.texel_density = max(
+                        texture.texel_density, density)
+                    mip = math.log2(max(density / pixels_per_unit, 1.0))
+                    if scene in texture.scene_mips:
+                        mip = min(mip, texture.scene_mips[scene])
+                    texture.scene_mips[scene] = mip
+
+    def write_streaming(self, levels):
+        """Writes texel density and the first needed mip level per scene relative to the written levels"""
+        (source_width, _) = self.get_image_sizes()[0]
+        (width, height, _) = levels[0][0]
+        Gearoenix.write_float(self.texel_density * width / source_width)
+        scale = math.log2(source_width / width)
+        max_mip = int(math.log2(max(width, height)))
+        if len(levels[0]) > 1:
+            max_mip = len(levels[0]) - 1
+        mips = sorted(self.scene_mips.items(), key=lambda sm: sm[0].instance_id)
+        Gearoenix.write_count(len(mips))
+        for (scene, mip) in mips:
+            Gearoenix.write_id(scene.instance_id)
+            Gearoenix.write_u8(min(max_mip, max(0, int(math.floor(mip - scale)))))
+
+    def write_levels(self, levels):
+        Gearoenix.write_u8(len(levels[0]))
+        for image_levels in levels:
+            for (_, _, data) in image_levels:
+                Gearoenix.write_file(data)
+
     def write(self):
         super().write()
-        Gearoenix.write_u8(13)  # texture_format TextureFormat::RgbaUint8
-        Gearoenix.write_u8(7)   # min_filter     Filter::LinearMipmapLinear;
+        quality = self.get_quality()
+        (texture_format, premultiplied, swizzle, _) = self.analyze()
+        Gearoenix.write_u8(texture_format)
+        if quality.mips == self.MIPS_NONE:
+            Gearoenix.write_u8(5)  # min_filter     Filter::Linear;
+        else:
+            Gearoenix.write_u8(7)  # min_filter     Filter::LinearMipmapLinear;
         Gearoenix.write_u8(5)   # mag_filter     Filter::Linear;
-        wrap = 3  # repeat
-        if self.blender_object.extension == 'EXTEND':
-            wrap = 1  # clamp to edge
+        wrap = self.get_wrap()
         Gearoenix.write_u8(wrap)
         Gearoenix.write_u8(wrap)
         Gearoenix.write_u8(wrap)
+        (encoding, levels) = self.get_levels(quality)
+        Gearoenix.write_u8(encoding)
+        Gearoenix.write_bool(premultiplied)
+        for (source, constant) in swizzle:
+            Gearoenix.write_u8(source)
+            Gearoenix.write_u8(constant)
+        self.report(levels)
+        self.write_streaming(levels)
         if self.instance_type == self.TYPE_2D:
-            Gearoenix.write_u16(self.blender_object.image.size[0])
-            Gearoenix.write_u16(self.blender_object.image.size[1])
-            Gearoenix.write_file(self.file)
+            Gearoenix.write_u16(levels[0][0][0])
+            Gearoenix.write_u16(levels[0][0][1])
+            self.write_levels(levels)
         elif self.instance_type == self.TYPE_CUBE:
-            self.write_6_face()
+            self.write_levels(levels)
         else:
             Gearoenix.terminate(
                 'Unspecified texture type, in:', self.blender_object.name)
@@ -1102,6 +2689,45 @@ class Texture(Gearoenix.ReferencingAsset):
             Gearoenix.terminate('Filepath is empty:', blender_object.name)
         return filepath
 
+    def report(self, levels):
+        """Adds the memory that channel packing and the profile saved to the texture report"""
+        source_texels = 0
+        for pixels in self.decode():
+            source_texels += pixels.shape[0] * pixels.shape[1] * 4
+        texels = 0
+        data = 0
+        channels = self.analyze()[3][0].shape[2]
+        for image_levels in levels:
+            for (width, height, level) in image_levels:
+                texels += width * height * channels
+                data += len(level)
+        source_data = sum(len(img) for img in self.get_images())
+        self.__class__.report_rows.append(
+            (self.get_reference_name(), channels, source_texels, texels, source_data, data))
+        Gearoenix.log_info(
+            'Texture', self.get_reference_name(), 'channels:', channels,
+            'texel bytes saved:', source_texels - texels,
+            'file bytes saved:', source_data - data)
+
+    @classmethod
+    def write_all(cls):
+        cls.report_rows = []
+        super().write_all()
+        report = open(
+            Gearoenix.get_profile_file_path(Gearoenix.PROFILE) + '.textures.txt', 'w')
+        report.write('name channels source-texel-bytes texel-bytes '
+                     'texel-bytes-saved source-file-bytes file-bytes file-bytes-saved\n')
+        for (name, channels, source_texels, texels, source_data, data) in cls.report_rows:
+            report.write(' '.join(str(v) for v in (
+                name, channels, source_texels, texels, source_texels - texels,
+                source_data, data, source_data - data)) + '\n')
+        report.close()
+
+    def get_wrap(self):
+        if self.blender_object.extension == 'EXTEND':
+            return 1  # clamp to edge
+        return 3  # repeat
+
     def is_cube(self):
         return self.instance_type == self.TYPE_CUBE
 
@@ -1114,6 +2740,688 @@ class Texture(Gearoenix.ReferencingAsset):
 Gearoenix.Texture = Texture
 
 
+class TextureQuality:
+    """Maximum resolution, encoding and mipmap policy of a texture role"""
+
+    def __init__(self, max_resolution,
+                 encoding=Gearoenix.Texture.ENCODING_PNG,
+                 mips=Gearoenix.Texture.MIPS_RUNTIME):
+        self.max_resolution = max_resolution
+        self.encoding = encoding
+        self.mips = mips
+
+
+Gearoenix.TextureQuality = TextureQuality
+
+
+class Profile:
+    """
+    Settings of a target platform, each selected profile is written
+    in its own gx3d file from the same read scenes.
+    ...
+    Attributes
+    ----------
+    textures : dict
+        texture role to its TextureQuality
+    """
+    ROLE_COLOR = 1
+    ROLE_EMISSION = 2
+    ROLE_METALLIC_ROUGHNESS = 3
+    ROLE_NORMAL = 4
+    ROLE_CUBE = 5
+
+    def __init__(self, name, textures, baked_skybox_cube_res, radiance_res, reflection_res):
+        self.name = name
+        self.textures = textures
+        self.baked_skybox_cube_res = baked_skybox_cube_res
+        self.radiance_res = radiance_res
+        self.reflection_res = reflection_res
+
+
+Gearoenix.Profile = Profile
+Gearoenix.PROFILES = (
+    Gearoenix.Profile('desktop', {
+        Gearoenix.Profile.ROLE_COLOR: Gearoenix.TextureQuality(
+            4096, Gearoenix.Texture.ENCODING_BC, Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_EMISSION: Gearoenix.TextureQuality(
+            4096, Gearoenix.Texture.ENCODING_BC, Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_METALLIC_ROUGHNESS: Gearoenix.TextureQuality(
+            4096, Gearoenix.Texture.ENCODING_BC, Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_NORMAL: Gearoenix.TextureQuality(4096),
+        Gearoenix.Profile.ROLE_CUBE: Gearoenix.TextureQuality(2048),
+    }, 1024, 512, 256),
+    Gearoenix.Profile('mobile', {
+        Gearoenix.Profile.ROLE_COLOR: Gearoenix.TextureQuality(
+            1024, mips=Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_EMISSION: Gearoenix.TextureQuality(
+            512, mips=Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_METALLIC_ROUGHNESS: Gearoenix.TextureQuality(
+            512, mips=Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_NORMAL: Gearoenix.TextureQuality(
+            1024, mips=Gearoenix.Texture.MIPS_BAKED),
+        Gearoenix.Profile.ROLE_CUBE: Gearoenix.TextureQuality(
+            512, mips=Gearoenix.Texture.MIPS_BAKED),
+    }, 512, 256, 128),
+)
+
+
+class ShelfPacker:
+    """Places rectangles in rows, height of None means the area can grow downward without limit"""
+
+    def __init__(self, width, height=None):
+        self.width = width
+        self.height = height
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+
+    def allocate(self, width, height):
+        if self.shelf_x + width > self.width:
+            self.shelf_y += self.shelf_height
+            self.shelf_x = 0
+            self.shelf_height = 0
+        if width > self.width or \
+                (self.height is not None and self.shelf_y + height > self.height):
+            return None
+        x = self.shelf_x
+        y = self.shelf_y
+        self.shelf_x += width
+        self.shelf_height = max(self.shelf_height, height)
+        return (x, y)
+
+    def get_used_height(self):
+        """Height of used rows rounded up to a power of two"""
+        used = self.shelf_y + self.shelf_height
+        height = 1
+        while height < used:
+            height *= 2
+        return height
+
+
+Gearoenix.ShelfPacker = ShelfPacker
+
+
+class TextureAtlas(Gearoenix.Texture):
+    """
+    A 2D texture that packs the small textures of a UI scene, so the
+    widgets of that scene can be drawn without texture switches.
+    ...
+    Attributes
+    ----------
+    rects : list
+        (source texture, x, y, width, height) of every packed texture in pixels
+    """
+
+    def __init__(self, scene, index):
+        self.init_generated(
+            self.D2_PREFIX + 'atlas-' + scene.get_reference_name() + '-' + str(index))
+        self.instance_type = self.TYPE_2D
+        self.origin_instance = None
+        self.roles = {Gearoenix.Profile.ROLE_COLOR}
+        self.blend_uses = set()
+        self.texel_density = 0.0
+        self.scene_mips = dict()
+        self.packing = None
+        self.levels_cache = dict()
+        self.size = Gearoenix.ATLAS_SIZE
+        self.page = numpy.zeros((self.size, self.size, 4), dtype=numpy.uint8)
+        self.pixels = None
+        self.file = None
+        self.rects = []
+        self.packer = Gearoenix.ShelfPacker(self.size, self.size)
+
+    def put(self, texture):
+        """Copies the texture into the atlas with an edge extended border, returns False if it is full"""
+        pad = Gearoenix.ATLAS_PADDING
+        pixels = texture.decode()[0]
+        (height, width) = pixels.shape[:2]
+        position = self.packer.allocate(width + pad * 2, height + pad * 2)
+        if position is None:
+            return False
+        (x, y) = position
+        self.page[y:y + height + pad * 2, x:x + width + pad * 2] = numpy.pad(
+            pixels, ((pad, pad), (pad, pad), (0, 0)), mode='edge')
+        self.rects.append((texture, x + pad, y + pad, width, height))
+        self.blend_uses |= texture.blend_uses
+        return True
+
+    def finalize(self):
+        """Crops the unused rows to the next power of two height and encodes the atlas"""
+        self.page = self.page[:self.packer.get_used_height()]
+        self.pixels = [self.page]
+        self.file = Gearoenix.encode_png(self.page)
+
+    def get_uv_rect(self, texture):
+        (height, width) = self.page.shape[:2]
+        for (t, x, y, w, h) in self.rects:
+            if t is texture:
+                return (x / width, y / height, w / width, h / height)
+        Gearoenix.terminate('Texture is not in atlas:', texture.name)
+
+    def get_image_files(self):
+        Gearoenix.terminate('Atlas does not have image file:', self.name)
+
+    def get_wrap(self):
+        return 1  # clamp to edge
+
+    def get_reference_name(self):
+        return self.name[len(self.D2_PREFIX):]
+
+    def write(self):
+        super().write()
+        Gearoenix.write_count(len(self.rects))
+        for (texture, x, y, w, h) in self.rects:
+            Gearoenix.write_string(texture.get_reference_name())
+            (u, v, du, dv) = self.get_uv_rect(texture)
+            Gearoenix.write_float(u)
+            Gearoenix.write_float(v)
+            Gearoenix.write_float(du)
+            Gearoenix.write_float(dv)
+
+    @staticmethod
+    def get_candidate(mat):
+        """Returns the texture of material if it can go into an atlas"""
+        texture = mat.base_color
+        if not isinstance(texture, Gearoenix.Texture):
+            return None
+        texture = texture.get_origin()
+        if texture.instance_type != texture.TYPE_2D or \
+                isinstance(texture, Gearoenix.TextureAtlas) or \
+                texture.roles != {Gearoenix.Profile.ROLE_COLOR}:
+            return None
+        if mat.instance_type == mat.TYPE_PBR:
+            for link in (mat.emission, mat.metallic, mat.normal_map):
+                if isinstance(link, Gearoenix.Texture):
+                    return None
+        if max(texture.get_image_sizes()[0]) > Gearoenix.ATLAS_MAX_TEXTURE_SIZE:
+            return None
+        return texture
+
+    @classmethod
+    def create_all(cls):
+        """Packs the textures that are only used by the meshes of a single UI scene"""
+        texture_users = collections.defaultdict(list)
+        mesh_users = collections.defaultdict(list)
+        blocked = set()
+        for scene in Gearoenix.Scene.instances.values():
+            for model in scene.get_all_models():
+                for mesh in model.meshes:
+                    mesh_users[mesh.get_origin()].append((scene, mesh))
+                    texture = cls.get_candidate(mesh.mat)
+                    if texture is not None:
+                        texture_users[texture].append((scene, mesh))
+                    elif isinstance(mesh.mat.base_color, Gearoenix.Texture):
+                        blocked.add(mesh.mat.base_color.get_origin())
+        scenes_textures = collections.defaultdict(list)
+        for texture, users in texture_users.items():
+            scene = users[0][0]
+            eligible = scene.instance_type == scene.TYPE_UI and texture not in blocked
+            for (_, mesh) in users:
+                origin = mesh.get_origin()
+                eligible = eligible and origin.has_unit_uv()
+                for (s, m) in mesh_users[origin]:
+                    eligible = eligible and s is scene and \
+                        cls.get_candidate(m.mat) is texture
+            if eligible:
+                scenes_textures[scene].append(texture)
+        for scene, textures in scenes_textures.items():
+            if len(textures) < 2:
+                continue
+            textures.sort(key=lambda t: (-t.decode()[0].shape[0], t.name))
+            atlases = [cls(scene, 0)]
+            for texture in textures:
+                if not atlases[-1].put(texture):
+                    atlases.append(cls(scene, len(atlases)))
+                    atlases[-1].put(texture)
+            for atlas in atlases:
+                atlas.finalize()
+                Gearoenix.log_info('Atlas', atlas.name,
+                                   'packed', len(atlas.rects), 'textures')
+                for (texture, _, _, _, _) in atlas.rects:
+                    atlas.replace(texture, texture_users[texture])
+
+    def replace(self, texture, users):
+        """Moves the UVs and materials of texture users to the atlas"""
+        (u, v, du, dv) = self.get_uv_rect(texture)
+        origins = set()
+        for (_, mesh) in users:
+            if isinstance(mesh.mat.alpha, Gearoenix.Texture):
+                mesh.mat.alpha = self
+            mesh.mat.base_color = self
+            origins.add(mesh.get_origin())
+        for origin in origins:
+            origin.transform_uv(u, v, du, dv)
+        del Gearoenix.Texture.instances[texture.name]
+
+
+Gearoenix.TextureAtlas = TextureAtlas
+
+
+class TrueType:
+    """
+    Minimal reader of TrueType fonts, it provides the outlines, metrics,
+    character map and kerning that exporter needs.
+    """
+
+    REQUIRED_TABLES = ('head', 'maxp', 'hhea', 'hmtx', 'loca', 'glyf', 'cmap')
+    KEPT_TABLES = ('OS/2', 'cvt ', 'fpgm', 'gasp', 'name', 'prep')
+
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+        (version, tables_count) = struct.unpack_from('>IH', data, 0)
+        if version not in (0x00010000, 0x74727565):
+            Gearoenix.terminate('Only TrueType outlines are supported, in:', name)
+        self.tables = dict()
+        for i in range(tables_count):
+            (tag, _, offset, length) = struct.unpack_from(
+                '>4sIII', data, 12 + i * 16)
+            self.tables[tag.decode('latin-1')] = (offset, length)
+        for tag in self.REQUIRED_TABLES:
+            if tag not in self.tables:
+                Gearoenix.terminate('Font does not have', tag, 'table, in:', name)
+        head = self.tables['head'][0]
+        self.units_per_em = struct.unpack_from('>H', data, head + 18)[0]
+        self.index_to_loc_format = struct.unpack_from('>h', data, head + 50)[0]
+        self.glyphs_count = struct.unpack_from(
+            '>H', data, self.tables['maxp'][0] + 4)[0]
+        hhea = self.tables['hhea'][0]
+        (self.ascender, self.descender, self.line_gap) = struct.unpack_from(
+            '>hhh', data, hhea + 4)
+        h_metrics_count = struct.unpack_from('>H', data, hhea + 34)[0]
+        hmtx = self.tables['hmtx'][0]
+        self.advances = []
+        self.left_side_bearings = []
+        for i in range(self.glyphs_count):
+            if i < h_metrics_count:
+                (advance, lsb) = struct.unpack_from('>Hh', data, hmtx + i * 4)
+            else:
+                lsb = struct.unpack_from(
+                    '>h', data, hmtx + h_metrics_count * 4 + (i - h_metrics_count) * 2)[0]
+            self.advances.append(advance)
+            self.left_side_bearings.append(lsb)
+        loca = self.tables['loca'][0]
+        if self.index_to_loc_format == 0:
+            self.glyph_offsets = [o * 2 for o in struct.unpack_from(
+                '>%dH' % (self.glyphs_count + 1), data, loca)]
+        else:
+            self.glyph_offsets = list(struct.unpack_from(
+                '>%dI' % (self.glyphs_count + 1), data, loca))
+        self.character_map = self.read_character_map()
+        self.kerning = self.read_kerning()
+
+    def read_character_map(self):
+        """Unicode code point to glyph index, from format 12 or format 4 subtables"""
+        data = self.data
+        cmap = self.tables['cmap'][0]
+        subtables_count = struct.unpack_from('>H', data, cmap + 2)[0]
+        best = None
+        best_rank = 0
+        for i in range(subtables_count):
+            (platform, encoding, offset) = struct.unpack_from(
+                '>HHI', data, cmap + 4 + i * 8)
+            offset += cmap
+            subtable_format = struct.unpack_from('>H', data, offset)[0]
+            rank = 0
+            if subtable_format == 12 and (platform, encoding) in {(3, 10), (0, 4), (0, 6)}:
+                rank = 2
+            elif subtable_format == 4 and (platform == 0 or (platform, encoding) == (3, 1)):
+                rank = 1
+            if rank > best_rank:
+                best = offset
+                best_rank = rank
+        if best is None:
+            Gearoenix.terminate('Font does not have a unicode character map, in:', self.name)
+        result = dict()
+        if best_rank == 2:
+            groups_count = struct.unpack_from('>I', data, best + 12)[0]
+            for i in range(groups_count):
+                (start, end, glyph) = struct.unpack_from(
+                    '>III', data, best + 16 + i * 12)
+                for c in range(start, end + 1):
+                    result[c] = glyph + c - start
+            return result
+        segments_count = struct.unpack_from('>H', data, best + 6)[0] // 2
+        ends = best + 14
+        starts = ends + segments_count * 2 + 2
+        deltas = starts + segments_count * 2
+        range_offsets = deltas + segments_count * 2
+        for i in range(segments_count):
+            end = struct.unpack_from('>H', data, ends + i * 2)[0]
+            start = struct.unpack_from('>H', data, starts + i * 2)[0]
+            delta = struct.unpack_from('>h', data, deltas + i * 2)[0]
+            range_offset = struct.unpack_from('>H', data, range_offsets + i * 2)[0]
+            for c in range(start, end + 1):
+                if c == 0xFFFF:
+                    continue
+                if range_offset == 0:
+                    glyph = (c + delta) & 0xFFFF
+                else:
+                    glyph = struct.unpack_from(
+                        '>H', data, range_offsets + i * 2 + range_offset + (c - start) * 2)[0]
+                    if glyph != 0:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph != 0:
+                    result[c] = glyph
+        return result
+
+    def read_kerning(self):
+        """(left glyph, right glyph) to kerning value from the format 0 subtables of kern table"""
+        result = dict()
+        if 'kern' not in self.tables:
+            return result
+        data = self.data
+        offset = self.tables['kern'][0]
+        (version, subtables_count) = struct.unpack_from('>HH', data, offset)
+        if version != 0:
+            return result
+        offset += 4
+        for _ in range(subtables_count):
+            (_, length, coverage) = struct.unpack_from('>HHH', data, offset)
+            if coverage >> 8 == 0 and coverage & 1 == 1:
+                pairs_count = struct.unpack_from('>H', data, offset + 6)[0]
+                for i in range(pairs_count):
+                    (left, right, value) = struct.unpack_from(
+                        '>HHh', data, offset + 14 + i * 6)
+                    result[(left, right)] = value
+            offset += length
+        return result
+
+    def get_glyph_data(self, glyph):
+        glyf = self.tables['glyf'][0]
+        return (glyf + self.glyph_offsets[glyph], glyf + self.glyph_offsets[glyph + 1])
+
+    def get_contours(self, glyph, depth=0):
+        """List of contours of glyph, each contour is a list of (x, y, on_curve)"""
+        if depth > 16:
+            Gearoenix.terminate('Too deep composite glyph in:', self.name)
+        data = self.data
+        (start, end) = self.get_glyph_data(glyph)
+        if start == end:
+            return []
+        contours_count = struct.unpack_from('>h', data, start)[0]
+        p = start + 10
+        if contours_count < 0:
+            contours = []
+            while True:
+                (flags, component) = struct.unpack_from('>HH', data, p)
+                p += 4
+                if flags & 1:
+                    (arg1, arg2) = struct.unpack_from('>hh', data, p)
+                    p += 4
+                else:
+                    (arg1, arg2) = struct.unpack_from('>bb', data, p)
+                    p += 2
+                (a, b, c, d) = (1.0, 0.0, 0.0, 1.0)
+                if flags & 0x8:
+                    a = d = struct.unpack_from('>h', data, p)[0] / 16384.0
+                    p += 2
+                elif flags & 0x40:
+                    (a, d) = (v / 16384.0 for v in struct.unpack_from('>hh', data, p))
+                    p += 4
+                elif flags & 0x80:
+                    (a, b, c, d) = (v / 16384.0 for v in struct.unpack_from('>hhhh', data, p))
+                    p += 8
+                if flags & 0x2:
+                    (dx, dy) = (arg1, arg2)
+                else:
+                    Gearoenix.log_info('Point matched glyph components are not moved, in:', self.name)
+                    (dx, dy) = (0, 0)
+                for contour in self.get_contours(component, depth + 1):
+                    contours.append([
+                        (a * x + c * y + dx, b * x + d * y + dy, on)
+                        for (x, y, on) in contour])
+                if not flags & 0x20:
+                    return contours
+        end_points = struct.unpack_from('>%dH' % contours_count, data, p)
+        p += contours_count * 2
+        p += 2 + struct.unpack_from('>H', data, p)[0]
+        points_count = end_points[-1] + 1 if contours_count > 0 else 0
+        flags = []
+        while len(flags) < points_count:
+            f = data[p]
+            p += 1
+            flags.append(f)
+            if f & 0x8:
+                flags.extend([f] * data[p])
+                p += 1
+        coordinates = []
+        for (short_bit, same_bit) in ((0x2, 0x10), (0x4, 0x20)):
+            values = []
+            v = 0
+            for f in flags:
+                if f & short_bit:
+                    delta = data[p]
+                    p += 1
+                    if not f & same_bit:
+                        delta = -delta
+                elif f & same_bit:
+                    delta = 0
+                else:
+                    delta = struct.unpack_from('>h', data, p)[0]
+                    p += 2
+                v += delta
+                values.append(v)
+            coordinates.append(values)
+        contours = []
+        first = 0
+        for last in end_points:
+            contours.append([
+                (coordinates[0][i], coordinates[1][i], (flags[i] & 1) == 1)
+                for i in range(first, last + 1)])
+            first = last + 1
+        return contours
+
+    @staticmethod
+    def flatten(contours, steps=8):
+        """Converts the quadratic contours to an (n, 4) array of line segments"""
+        segments = []
+        for contour in contours:
+            if len(contour) < 2:
+                continue
+            points = []
+            for i, (x, y, on) in enumerate(contour):
+                (px, py, previous_on) = contour[i - 1]
+                if not on and not previous_on:
+                    points.append(((x + px) * 0.5, (y + py) * 0.5, True))
+                points.append((x, y, on))
+            first = 0
+            while not points[first][2]:
+                first += 1
+            points = points[first:] + points[:first] + [points[first]]
+            (cx, cy, _) = points[0]
+            i = 1
+            while i < len(points):
+                (x, y, on) = points[i]
+                if on:
+                    segments.append((cx, cy, x, y))
+                    (cx, cy) = (x, y)
+                    i += 1
+                    continue
+                (ex, ey, _) = points[i + 1]
+                (lx, ly) = (cx, cy)
+                for step in range(1, steps + 1):
+                    t = step / steps
+                    u = 1.0 - t
+                    nx = u * u * cx + 2.0 * u * t * x + t * t * ex
+                    ny = u * u * cy + 2.0 * u * t * y + t * t * ey
+                    segments.append((lx, ly, nx, ny))
+                    (lx, ly) = (nx, ny)
+                (cx, cy) = (ex, ey)
+                i += 2
+        return numpy.array(segments, dtype=numpy.float64).reshape((-1, 4))
+
+    def render_sdf(self, glyph, size, spread):
+        """
+        Signed distance field of glyph where em is size pixels, values are
+        0.5 on the outline, higher inside and saturate after spread pixels.
+        Returns (left, top, uint8 image) or None for an empty glyph.
+        """
+        segments = self.flatten(self.get_contours(glyph)) * (size / self.units_per_em)
+        if len(segments) < 1:
+            return None
+        left = math.floor(segments[:, 0::2].min()) - spread
+        right = math.ceil(segments[:, 0::2].max()) + spread
+        bottom = math.floor(segments[:, 1::2].min()) - spread
+        top = math.ceil(segments[:, 1::2].max()) + spread
+        (width, height) = (right - left, top - bottom)
+        xs = numpy.tile(left + numpy.arange(width) + 0.5, height)
+        ys = numpy.repeat(top - numpy.arange(height) - 0.5, width)
+        (x0, y0, x1, y1) = (segments[:, i] for i in range(4))
+        (dx, dy) = (x1 - x0, y1 - y0)
+        length2 = numpy.maximum(dx * dx + dy * dy, 1e-12)
+        distance = numpy.empty(xs.shape)
+        winding = numpy.zeros(xs.shape, dtype=numpy.int64)
+        chunk = max(1, (1 << 22) // len(segments))
+        for c in range(0, len(xs), chunk):
+            px = xs[c:c + chunk, None]
+            py = ys[c:c + chunk, None]
+            t = numpy.clip(((px - x0) * dx + (py - y0) * dy) / length2, 0.0, 1.0)
+            distance[c:c + chunk] = numpy.sqrt(
+                ((x0 + t * dx - px) ** 2 + (y0 + t * dy - py) ** 2).min(axis=1))
+            upward = (y0 <= py) & (py < y1)
+            downward = (y1 <= py) & (py < y0)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                crossing = x0 + (py - y0) * dx / dy > px
+            winding[c:c + chunk] = ((upward & crossing).sum(axis=1) -
+                                    (downward & crossing).sum(axis=1))
+        signed = numpy.where(winding != 0, distance, -distance)
+        image = numpy.clip(0.5 + signed / (2.0 * spread), 0.0, 1.0) * 255.0 + 0.5
+        return (left, top, image.astype(numpy.uint8).reshape((height, width)))
+
+    def get_components(self, glyph):
+        """(offset in glyph data, glyph index) of the components of a composite glyph"""
+        data = self.data
+        (start, end) = self.get_glyph_data(glyph)
+        if start == end or struct.unpack_from('>h', data, start)[0] >= 0:
+            return []
+        components = []
+        p = start + 10
+        while True:
+            (flags, component) = struct.unpack_from('>HH', data, p)
+            components.append((p + 2 - start, component))
+            p += 8 if flags & 1 else 6
+            if flags & 0x8:
+                p += 2
+            elif flags & 0x40:
+                p += 4
+            elif flags & 0x80:
+                p += 8
+            if not flags & 0x20:
+                return components
+
+    def get_table(self, tag):
+        (offset, length) = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    @staticmethod
+    def checksum(data):
+        data = bytes(data) + b'\0' * (-len(data) % 4)
+        return int(numpy.frombuffer(data, dtype='>u4').sum(dtype=numpy.uint64)) & 0xFFFFFFFF
+
+    @classmethod
+    def build(cls, tables):
+        """Assembles a font file from its tables"""
+        tags = sorted(tables)
+        entry_selector = int(math.log2(len(tags)))
+        search_range = 16 * (1 << entry_selector)
+        font = bytearray(struct.pack(
+            '>IHHHH', 0x00010000, len(tags), search_range, entry_selector,
+            len(tags) * 16 - search_range))
+        offset = 12 + 16 * len(tags)
+        body = bytearray()
+        head_offset = 0
+        for tag in tags:
+            data = tables[tag]
+            if tag == 'head':
+                head_offset = offset + len(body)
+            font += struct.pack('>4sIII', tag.encode('latin-1'),
+                                cls.checksum(data), offset + len(body), len(data))
+            body += data + b'\0' * (-len(data) % 4)
+        font += body
+        struct.pack_into('>I', font, head_offset + 8,
+                         (0xB1B0AFBA - cls.checksum(font)) & 0xFFFFFFFF)
+        return bytes(font)
+
+    def subset(self, characters):
+        """
+        Rebuilds the font with only the glyphs of characters, their components
+        and .notdef. Glyph indexed tables that are not rebuilt are dropped.
+        """
+        character_map = dict()
+        glyphs = {0}
+        for c in characters:
+            if ord(c) in self.character_map:
+                character_map[ord(c)] = self.character_map[ord(c)]
+                glyphs.add(self.character_map[ord(c)])
+        stack = list(glyphs)
+        while len(stack) > 0:
+            for (_, component) in self.get_components(stack.pop()):
+                if component not in glyphs:
+                    glyphs.add(component)
+                    stack.append(component)
+        order = sorted(glyphs)
+        new_index = {old: new for (new, old) in enumerate(order)}
+        glyf = bytearray()
+        loca = []
+        hmtx = bytearray()
+        for old in order:
+            loca.append(len(glyf))
+            (start, end) = self.get_glyph_data(old)
+            data = bytearray(self.data[start:end])
+            for (offset, component) in self.get_components(old):
+                struct.pack_into('>H', data, offset, new_index[component])
+            glyf += data + b'\0' * (-len(data) % 4)
+            hmtx += struct.pack('>Hh', self.advances[old], self.left_side_bearings[old])
+        loca.append(len(glyf))
+        groups = []
+        for code in sorted(character_map):
+            glyph = new_index[character_map[code]]
+            if len(groups) > 0 and groups[-1][1] + 1 == code and \
+                    groups[-1][2] + code - groups[-1][0] == glyph:
+                groups[-1][1] = code
+            else:
+                groups.append([code, code, glyph])
+        cmap = struct.pack('>HHHHI', 0, 1, 3, 10, 12) + struct.pack(
+            '>HHIII', 12, 0, 16 + 12 * len(groups), 0, len(groups)) + \
+            b''.join(struct.pack('>III', *g) for g in groups)
+        head = bytearray(self.get_table('head'))
+        struct.pack_into('>I', head, 8, 0)
+        struct.pack_into('>h', head, 50, 1)
+        maxp = bytearray(self.get_table('maxp'))
+        struct.pack_into('>H', maxp, 4, len(order))
+        hhea = bytearray(self.get_table('hhea'))
+        struct.pack_into('>H', hhea, 34, len(order))
+        tables = {
+            'cmap': cmap,
+            'glyf': glyf,
+            'head': head,
+            'hhea': hhea,
+            'hmtx': hmtx,
+            'loca': struct.pack('>%dI' % len(loca), *loca),
+            'maxp': maxp,
+        }
+        for tag in self.KEPT_TABLES:
+            if tag in self.tables:
+                tables[tag] = self.get_table(tag)
+        if 'post' in self.tables:
+            tables['post'] = struct.pack('>I', 0x00030000) + self.get_table('post')[4:32]
+        pairs = sorted(
+            (new_index[l], new_index[r], v) for ((l, r), v) in self.kerning.items()
+            if l in new_index and r in new_index and v != 0)
+        if 0 < len(pairs) and 14 + 6 * len(pairs) <= 0xFFFF:
+            entry_selector = int(math.log2(len(pairs)))
+            search_range = 6 * (1 << entry_selector)
+            tables['kern'] = struct.pack(
+                '>HHHHHHHHH', 0, 1, 0, 14 + 6 * len(pairs), 1, len(pairs),
+                search_range, entry_selector, 6 * len(pairs) - search_range) + \
+                b''.join(struct.pack('>HHh', *p) for p in pairs)
+        return self.build(tables)
+
+
+Gearoenix.TrueType = TrueType
+
+
 class Font(Gearoenix.ReferencingAsset):
     TYPE_2D = 1
     TYPE_3D = 2
@@ -1134,10 +3442,198 @@ class Font(Gearoenix.ReferencingAsset):
             Gearoenix.terminate(
                 'Unspecified font type, in:', blender_object.name)
         self.file = Gearoenix.read_file(self.name)
+        self.true_type = None
+        self.atlas = None
+        self.subset = None
+
+    def get_true_type(self):
+        if self.true_type is None:
+            self.true_type = Gearoenix.TrueType(self.file, self.name)
+        return self.true_type
+
+    def get_characters(self):
+        """Characters of all text and edit widgets of this font plus the extra charset"""
+        characters = set(Gearoenix.FONT_EXTRA_CHARSET)
+        for model in Gearoenix.Model.instances.values():
+            if model.instance_type != model.TYPE_WIDGET or \
+                    model.widget_type not in (model.TYPE_TEXT, model.TYPE_EDIT) or \
+                    model.font.get_origin() is not self:
+                continue
+            characters |= set(model.text)
+        characters.discard('\n')
+        characters.add(' ')
+        return sorted(characters)
+
+    def get_atlas(self):
+        """
+        Renders the signed distance fields of the used glyphs in parallel and
+        packs them, returns (image, glyphs, kerning). Each glyph is
+        (code point, glyph index, x, y, width, height, left, top) in pixels.
+        """
+        if self.atlas is not None:
+            return self.atlas
+        true_type = self.get_true_type()
+        size = Gearoenix.FONT_SDF_SIZE
+        spread = Gearoenix.FONT_SDF_SPREAD
+        characters = []
+        for c in self.get_characters():
+            if ord(c) in true_type.character_map:
+                characters.append((ord(c), true_type.character_map[ord(c)]))
+            else:
+                Gearoenix.log_info('Character', repr(c), 'is not in font', self.name)
+        glyphs = sorted(set(g for (_, g) in characters))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            fields = dict(zip(glyphs, executor.map(
+                lambda g: true_type.render_sdf(g, size, spread), glyphs)))
+        atlas_width = Gearoenix.FONT_ATLAS_WIDTH
+        while True:
+            packer = Gearoenix.ShelfPacker(atlas_width)
+            places = dict()
+            for g in sorted(glyphs, key=lambda g: -1 if fields[g] is None else -fields[g][2].shape[0]):
+                if fields[g] is None:
+                    places[g] = (0, 0, 0, 0, 0, 0)
+                    continue
+                (left, top, field) = fields[g]
+                (height, width) = field.shape
+                position = packer.allocate(width + 1, height + 1)
+                if position is None:
+                    Gearoenix.terminate('Glyph is bigger than font atlas in:', self.name)
+                places[g] = (position[0], position[1], width, height, left, top)
+            if packer.get_used_height() <= Gearoenix.FONT_ATLAS_MAX_SIZE:
+                break
+            if atlas_width >= Gearoenix.FONT_ATLAS_MAX_SIZE:
+                Gearoenix.terminate('Glyphs do not fit in the biggest font atlas in:', self.name,
+                                    'characters:', len(characters))
+            atlas_width *= 2
+        image = numpy.zeros(
+            (packer.get_used_height(), atlas_width), dtype=numpy.uint8)
+        for g, (x, y, width, height, _, _) in places.items():
+            if fields[g] is not None:
+                image[y:y + height, x:x + width] = fields[g][2]
+        codes = collections.defaultdict(list)
+        for (c, g) in characters:
+            codes[g].append(c)
+        kerning = []
+        for ((left_glyph, right_glyph), value) in true_type.kerning.items():
+            if value == 0:
+                continue
+            for left_code in codes.get(left_glyph, []):
+                for right_code in codes.get(right_glyph, []):
+                    kerning.append((left_code, right_code, value))
+        kerning.sort()
+        self.atlas = (
+            image, [(c, g) + places[g] for (c, g) in characters], kerning)
+        Gearoenix.log_info('Font', self.name, 'atlas', image.shape,
+                           'glyphs:', len(characters), 'kerning pairs:', len(kerning))
+        return self.atlas
+
+    def layout(self, text, space_character, space_word, space_line, h_align, v_align):
+        """
+        Lays out a static text in em units with its origin aligned like the widget,
+        returns ([(atlas glyph index, pen x, pen y)], (min x, min y, max x, max y)).
+        """
+        true_type = self.get_true_type()
+        (_, glyphs, kerning) = self.get_atlas()
+        em = float(true_type.units_per_em)
+        indices = {g[0]: i for (i, g) in enumerate(glyphs)}
+        kerning = {(l, r): v / em for (l, r, v) in kerning}
+        line_advance = (true_type.ascender - true_type.descender +
+                        true_type.line_gap) / em * space_line
+        ascender = true_type.ascender / em
+        descender = true_type.descender / em
+        lines = []
+        for (line_index, line) in enumerate(text.split('\n')):
+            run = []
+            x = 0.0
+            previous = None
+            for c in line:
+                code = ord(c)
+                if code not in indices:
+                    Gearoenix.log_info('Character', repr(c), 'is not in font', self.name)
+                    continue
+                if previous is not None:
+                    x += kerning.get((previous, code), 0.0)
+                index = indices[code]
+                if glyphs[index][4] > 0:
+                    run.append([index, x, -line_index * line_advance])
+                advance = true_type.advances[glyphs[index][1]] / em * (1.0 + space_character)
+                if c == ' ':
+                    advance *= 1.0 + space_word
+                x += advance
+                previous = code
+            lines.append((run, x))
+        width = max(w for (_, w) in lines)
+        top = ascender
+        bottom = descender - (len(lines) - 1) * line_advance
+        if v_align == 2:
+            dy = -top
+        elif v_align == 1:
+            dy = -(top + bottom) * 0.5
+        else:
+            dy = -bottom
+        result = []
+        for (run, line_width) in lines:
+            if h_align == 1:
+                dx = -line_width * 0.5
+            elif h_align == 3:
+                dx = -line_width
+            else:
+                dx = 0.0
+            for (index, x, y) in run:
+                result.append((index, x + dx, y + dy))
+        if h_align == 1:
+            (min_x, max_x) = (-width * 0.5, width * 0.5)
+        elif h_align == 3:
+            (min_x, max_x) = (-width, 0.0)
+        else:
+            (min_x, max_x) = (0.0, width)
+        return (result, (min_x, bottom + dy, max_x, top + dy))
+
+    def write_atlas(self):
+        """Writes the atlas, lengths are in em and texture coordinates are normalized"""
+        true_type = self.get_true_type()
+        (image, glyphs, kerning) = self.get_atlas()
+        (height, width) = image.shape
+        em = float(true_type.units_per_em)
+        size = float(Gearoenix.FONT_SDF_SIZE)
+        Gearoenix.write_float(Gearoenix.FONT_SDF_SPREAD / size)
+        Gearoenix.write_float(true_type.ascender / em)
+        Gearoenix.write_float(true_type.descender / em)
+        Gearoenix.write_float(true_type.line_gap / em)
+        Gearoenix.write_u16(width)
+        Gearoenix.write_u16(height)
+        Gearoenix.write_file(Gearoenix.encode_png(image[:, :, None]))
+        Gearoenix.write_count(len(glyphs))
+        for (code, g, x, y, w, h, left, top) in glyphs:
+            Gearoenix.write_u32(code)
+            Gearoenix.write_float(true_type.advances[g] / em)
+            Gearoenix.write_float(left / size)
+            Gearoenix.write_float(top / size)
+            Gearoenix.write_float(w / size)
+            Gearoenix.write_float(h / size)
+            Gearoenix.write_float(x / width)
+            Gearoenix.write_float(y / height)
+            Gearoenix.write_float(w / width)
+            Gearoenix.write_float(h / height)
+        Gearoenix.write_count(len(kerning))
+        for (left_code, right_code, value) in kerning:
+            Gearoenix.write_u32(left_code)
+            Gearoenix.write_u32(right_code)
+            Gearoenix.write_float(value / em)
 
     def write(self):
         super().write()
-        Gearoenix.write_file(self.file)
+        self.write_atlas()
+        Gearoenix.write_bool(Gearoenix.EXPORT_FONT_TTF)
+        if Gearoenix.EXPORT_FONT_TTF:
+            Gearoenix.write_file(self.get_subset())
+
+    def get_subset(self):
+        if self.subset is None:
+            self.subset = self.get_true_type().subset(self.get_characters())
+            Gearoenix.log_info('Font', self.name, 'is subset from', len(self.file),
+                               'to', len(self.subset), 'bytes')
+        return self.subset
 
     @staticmethod
     def get_name_from_blender_object(blender_object):
@@ -1156,7 +3652,11 @@ class Font(Gearoenix.ReferencingAsset):
 Gearoenix.Font = Font
 
 
-class Material:
+class Material(Gearoenix.Asset):
+    """
+    Material of a mesh object, materials with the same content are collapsed
+    into one table entry after all of the exporter stages by create_all.
+    """
     TYPE_PBR = 1
     TYPE_UNLIT = 2
 
@@ -1167,7 +3667,7 @@ class Material:
     FIELD_IS_TEXTURE = 2
     FIELD_IS_VECTOR = 3
 
-    def read_links(self, name):
+    def read_links(self, name, role):
         if name not in self.inputs or self.inputs[name] is None:
             Gearoenix.terminate('Node input', name,
                                 'is not correct in', blender_object.name)
@@ -1184,6 +3684,7 @@ class Material:
                 Gearoenix.terminate(
                     'Your texture name is wrong in:', self.blender_object.name,
                     'link:', i.name, 'texture:', img.name)
+            txt.add_role(role)
             return txt
         else:
             Gearoenix.terminate(
@@ -1191,10 +3692,14 @@ class Material:
 
     def init_pbr(self):
         self.init_unlit()
-        self.emission = self.read_links('Emission')
-        self.metallic = self.read_links('Metallic')
-        self.normal_map = self.read_links('Normal')
-        self.roughness = self.read_links('Roughness')
+        self.emission = self.read_links(
+            'Emission', Gearoenix.Profile.ROLE_EMISSION)
+        self.metallic = self.read_links(
+            'Metallic', Gearoenix.Profile.ROLE_METALLIC_ROUGHNESS)
+        self.normal_map = self.read_links(
+            'Normal', Gearoenix.Profile.ROLE_NORMAL)
+        self.roughness = self.read_links(
+            'Roughness', Gearoenix.Profile.ROLE_METALLIC_ROUGHNESS)
         if isinstance(self.metallic, Gearoenix.Texture) != isinstance(self.roughness, Gearoenix.Texture):
             Gearoenix.terminate(
                 '"Metallic" and "Roughness" must be both scalar or texture:', self.blender_object.name)
@@ -1203,8 +3708,10 @@ class Material:
                 '"Metallic" and "Roughness" must be both pointing to the same texture:', self.blender_object.name)
 
     def init_unlit(self):
-        self.alpha = self.read_links('Alpha')
-        self.base_color = self.read_links('Base Color')
+        self.alpha = self.read_links(
+            'Alpha', Gearoenix.Profile.ROLE_COLOR)
+        self.base_color = self.read_links(
+            'Base Color', Gearoenix.Profile.ROLE_COLOR)
         if isinstance(self.alpha, Gearoenix.Texture) and (not isinstance(self.base_color, Gearoenix.Texture) or self.alpha.instance_id != self.base_color.instance_id):
             Gearoenix.terminate(
                 'If "Alpha" is texture then it must point to the texture that "Base Color" is pointing:', self.blender_object.name)
@@ -1215,6 +3722,8 @@ class Material:
             Gearoenix.terminate(
                 '"Blend Mode" in material must be set to "Alpha Clip" or "Alpha Blend" in:', self.blender_object.name)
         self.is_tansparent = self.mat.blend_method == 'BLEND'
+        if isinstance(self.base_color, Gearoenix.Texture):
+            self.base_color.add_blend_use(self.is_tansparent)
         if self.mat.shadow_method not in {'CLIP', 'NONE'}:
             Gearoenix.terminate(
                 '"Shadow Mode" in material must be set to "Alpha Clip" or "None" in:', self.blender_object.name)
@@ -1223,6 +3732,9 @@ class Material:
 
     def __init__(self, blender_object):
         self.blender_object = blender_object
+        self.origin_instance = None
+        self.instance_id = None
+        self.offset = 0
         if len(blender_object.material_slots) < 1:
             Gearoenix.terminate('There is no material:', blender_object.name)
         if len(blender_object.material_slots) > 1:
@@ -1258,6 +3770,34 @@ class Material:
             Gearoenix.terminate(
                 'Unexpected material type in:', self.blender_object.name)
 
+    def get_textures(self):
+        links = [self.base_color, self.alpha]
+        if self.instance_type == self.TYPE_PBR:
+            links += [self.emission, self.metallic, self.normal_map]
+        textures = []
+        for l in links:
+            if isinstance(l, Gearoenix.Texture) and l not in textures:
+                textures.append(l)
+        return textures
+
+    @staticmethod
+    def get_link_key(l):
+        if isinstance(l, Gearoenix.Texture):
+            return ('texture', l.get_origin().instance_id)
+        if isinstance(l, float):
+            return round(l, 6)
+        return tuple(round(e, 6) for e in l)
+
+    def get_key(self):
+        """Hashable content of material, equivalent materials have equal keys"""
+        key = (self.instance_type, self.get_link_key(self.base_color),
+               self.get_link_key(self.alpha), self.is_tansparent,
+               self.is_shadow_caster, round(self.alpha_cutoff, 6))
+        if self.instance_type == self.TYPE_PBR:
+            key += (self.get_link_key(self.emission), self.get_link_key(self.metallic),
+                    self.get_link_key(self.roughness), self.get_link_key(self.normal_map))
+        return key
+
     def write_link(self, l, s=4):
         if isinstance(l, Gearoenix.Texture):
             Gearoenix.write_bool(True)
@@ -1301,8 +3841,46 @@ class Material:
         Gearoenix.write_bool(self.is_shadow_caster)
         Gearoenix.write_float(self.alpha_cutoff)
 
+    @classmethod
+    def create_all(cls):
+        """
+        Gives ids to the materials of drawn meshes, equivalent materials share one id.
+        Representative of equivalent materials is the one with the least Blender
+        name, so the ids do not depend on the order of scenes and meshes.
+        """
+        groups = dict()
+        for scene in Gearoenix.Scene.instances.values():
+            for (_, mesh) in scene.get_placed_meshes():
+                if mesh.mat.instance_id is None:
+                    groups.setdefault(mesh.mat.get_key(), dict())[id(mesh.mat)] = mesh.mat
+        groups = [(min(m.mat.name for m in mats.values()), repr(key), list(mats.values()))
+                  for (key, mats) in groups.items()]
+        for (name, _, mats) in sorted(groups, key=lambda g: g[:2]):
+            mat = min(mats, key=lambda m: m.mat.name)
+            unique_name = name
+            suffix = 1
+            while unique_name in cls.instances:
+                unique_name = name + '-' + str(suffix)
+                suffix += 1
+            mat.name = unique_name
+            mat.instance_id = Gearoenix.allocate_id(cls.get_kind(), mat.get_id_key())
+            cls.instances[unique_name] = mat
+            for other in mats:
+                if other is not mat:
+                    other.origin_instance = mat
+                    other.instance_id = mat.instance_id
+        Gearoenix.log_info('Materials are collapsed into', len(cls.instances), 'unique ones')
+
+    def get_origin(self):
+        if self.origin_instance is None:
+            return self
+        return self.origin_instance
+
+    def get_reference_name(self):
+        return self.name
+
     def write(self):
-        Gearoenix.write_type_id(self.instance_type)
+        super().write()
         if self.instance_type == self.TYPE_PBR:
             self.write_pbr()
         elif self.instance_type == self.TYPE_UNLIT:
@@ -1318,6 +3896,8 @@ Gearoenix.Material = Material
 class Mesh(Gearoenix.UniqueAsset):
     TYPE_BASIC = 1
 
+    UV_INDEX = 10
+
     @classmethod
     def init(cls):
         super().init()
@@ -1326,6 +3906,7 @@ class Mesh(Gearoenix.UniqueAsset):
     def __init__(self, blender_object):
         super().__init__(blender_object)
         self.box = Gearoenix.Aabb()
+        self.arrays = None
         if blender_object.name.startswith(self.BASIC_PREFIX):
             self.instance_type = self.TYPE_BASIC
         else:
@@ -1401,13 +3982,101 @@ class Mesh(Gearoenix.UniqueAsset):
 
     def write(self):
         super().write()
-        Gearoenix.write_u64(len(self.vertices))
+        Gearoenix.write_count(len(self.vertices))
         for vertex in self.vertices:
             for e in vertex:
                 Gearoenix.write_float(e)
         Gearoenix.write_u32_array(self.indices)
         self.box.write()
 
+    def has_unit_uv(self):
+        for vertex in self.vertices:
+            for e in vertex[self.UV_INDEX:self.UV_INDEX + 2]:
+                if e < -Gearoenix.EPSILON or e > 1.0 + Gearoenix.EPSILON:
+                    return False
+        return True
+
+    def get_arrays(self):
+        """Positions, UVs and triangle indices of the origin mesh as numpy arrays"""
+        if self.arrays is None:
+            vertices = numpy.array(self.vertices, dtype=numpy.float64)
+            self.arrays = (
+                vertices[:, :3],
+                vertices[:, self.UV_INDEX:self.UV_INDEX + 2],
+                numpy.array(self.indices, dtype=numpy.int64).reshape((-1, 3)))
+        return self.arrays
+
+    def get_uv_density(self, matrix):
+        """Area weighted UV units per world unit of the mesh under the matrix"""
+        (positions, uvs, triangles) = self.get_arrays()
+        if len(triangles) < 1:
+            return 0.0
+        world = positions @ matrix[:3, :3].T + matrix[:3, 3]
+        w = world[triangles]
+        world_area = numpy.linalg.norm(
+            numpy.cross(w[:, 1] - w[:, 0], w[:, 2] - w[:, 0]), axis=1).sum()
+        t = uvs[triangles]
+        e1 = t[:, 1] - t[:, 0]
+        e2 = t[:, 2] - t[:, 0]
+        uv_area = numpy.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]).sum()
+        if world_area <= 0.0:
+            return 0.0
+        return math.sqrt(uv_area / world_area)
+
+    @classmethod
+    def create_generated(cls, name, vertices, indices, mat):
+        """Makes an origin mesh from vertex tuples that exporter has built"""
+        self = cls.__new__(cls)
+        self.init_generated(cls.BASIC_PREFIX + name)
+        self.origin_instance = None
+        self.instance_type = cls.TYPE_BASIC
+        self.arrays = None
+        self.mat = mat
+        self.vertices = vertices
+        self.indices = indices
+        self.box = Gearoenix.Aabb()
+        for vertex in vertices:
+            self.box.put(mathutils.Vector(vertex[:3]))
+        return self
+
+    def get_baked_vertices(self, matrix):
+        """
+        Vertices of origin transformed by the numpy matrix, normals go with the
+        inverse transpose and tangents as surface directions with the matrix.
+        Returns (vertices, indices), triangle winding is kept for mirroring matrices.
+        """
+        vertices = numpy.array(self.vertices, dtype=numpy.float64)
+        rotation = matrix[:3, :3]
+        positions = vertices[:, 0:3] @ rotation.T + matrix[:3, 3]
+        normals = vertices[:, 3:6] @ numpy.linalg.inv(rotation)
+        normals /= numpy.maximum(numpy.linalg.norm(normals, axis=1), 1e-12)[:, None]
+        tangents = vertices[:, 6:9] @ rotation.T
+        tangents /= numpy.maximum(numpy.linalg.norm(tangents, axis=1), 1e-12)[:, None]
+        mirrored = numpy.linalg.det(rotation) < 0.0
+        signs = -vertices[:, 9:10] if mirrored else vertices[:, 9:10]
+        baked = numpy.concatenate((positions, normals, tangents, signs, vertices[:, 10:]), axis=1)
+        indices = numpy.array(self.indices, dtype=numpy.int64).reshape((-1, 3))
+        if mirrored:
+            indices = indices[:, ::-1]
+        return ([tuple(float(e) for e in v) for v in baked], [int(i) for i in indices.flatten()])
+
+    @classmethod
+    def remove_unused(cls):
+        """Removes origin meshes that no model of any scene uses anymore"""
+        used = set()
+        for scene in Gearoenix.Scene.instances.values():
+            for (_, mesh) in scene.get_placed_meshes():
+                used.add(mesh.get_origin().name)
+        for name in [n for n in cls.instances if n not in used]:
+            del cls.instances[name]
+
+    def transform_uv(self, u, v, du, dv):
+        self.arrays = None
+        i = self.UV_INDEX
+        self.vertices = [
+            vertex[:i] + (u + vertex[i] * du, v + vertex[i + 1] * dv) + vertex[i + 2:]
+            for vertex in self.vertices]
+
 
 Gearoenix.Mesh = Mesh
 
@@ -1484,8 +4153,10 @@ class Model(Gearoenix.Asset):
     def __init__(self, blender_object):
         super().__init__(blender_object)
         self.matrix = blender_object.matrix_world
+        self.world_box = None
         self.meshes = []
         self.model_children = []
+        self.lights = []
         self.collider = Gearoenix.Collider.read(blender_object)
         for c in blender_object.children:
             ins = Gearoenix.Mesh.read(c)
@@ -1508,6 +4179,10 @@ class Model(Gearoenix.Asset):
         else:
             Gearoenix.terminate(
                 'Unspecified model type, in:', blender_object.name)
+        if Gearoenix.AUTO_CONVEX_COLLIDER and self.instance_type == self.TYPE_DYNAMIC and \
+                self.collider.MY_TYPE == Gearoenix.Collider.GHOST and len(self.meshes) > 0:
+            self.collider = Gearoenix.ConvexCollider()
+        self.collider.attach(self)
 
     def write_widget(self):
         if self.widget_type == self.TYPE_TEXT or\
@@ -1520,18 +4195,66 @@ class Model(Gearoenix.Asset):
             Gearoenix.write_double(self.font_space_character)
             Gearoenix.write_double(self.font_space_word)
             Gearoenix.write_double(self.font_space_line)
+        if self.widget_type == self.TYPE_TEXT:
+            self.write_text_layout()
+
+    def write_text_layout(self):
+        """Writes the pre-shaped glyph run of a static text, edit widgets are laid out by engine"""
+        (glyphs, box) = self.font.get_origin().layout(
+            self.text, self.font_space_character, self.font_space_word,
+            self.font_space_line, self.h_align, self.v_align)
+        for v in box:
+            Gearoenix.write_float(v)
+        Gearoenix.write_count(len(glyphs))
+        for (index, x, y) in glyphs:
+            Gearoenix.write_u32(index)
+            Gearoenix.write_float(x)
+            Gearoenix.write_float(y)
+
+    @classmethod
+    def create_generated(cls, name, meshes):
+        """Makes a static model with identity transformation for exporter made meshes"""
+        self = cls.__new__(cls)
+        self.init_generated(cls.STATIC_PREFIX + name)
+        self.instance_type = cls.TYPE_STATIC
+        self.matrix = mathutils.Matrix.Identity(4)
+        self.world_box = None
+        self.meshes = meshes
+        self.model_children = []
+        self.lights = []
+        self.collider = Gearoenix.GhostCollider()
+        return self
+
+    def is_batchable(self):
+        return self.instance_type == self.TYPE_STATIC and len(self.model_children) == 0 \
+            and len(self.meshes) > 0 and self.collider.MY_TYPE == Gearoenix.Collider.GHOST
+
+    def is_instanceable(self):
+        return self.is_batchable() and len(self.meshes) == 1
+
+    def get_world_box(self):
+        """World space box of meshes of model and all of its descendant models"""
+        if self.world_box is None:
+            self.world_box = Gearoenix.Aabb()
+            for mesh in self.meshes:
+                self.world_box.put_box(mesh.get_origin().box, self.matrix)
+            for child in self.model_children:
+                self.world_box.put_box(child.get_world_box())
+        return self.world_box
 
     def write(self):
         super().write()
         if self.instance_type == self.TYPE_WIDGET:
             Gearoenix.write_type_id(self.widget_type)
-        Gearoenix.write_matrix(self.blender_object.matrix_world)
-        # self.collider.write()
-        Gearoenix.write_u64(len(self.meshes))
+        Gearoenix.write_matrix(self.matrix)
+        self.get_world_box().write()
+        self.collider.write()
+        Gearoenix.write_count(len(self.meshes))
         for m in self.meshes:
             Gearoenix.write_id(m.instance_id)
-            m.mat.write()
+            Gearoenix.write_id(m.mat.instance_id)
         Gearoenix.write_instances_ids(self.model_children)
+        Gearoenix.write_instances_ids(self.lights)
         if self.instance_type == self.TYPE_WIDGET:
             self.write_widget()
 
@@ -1543,6 +4266,18 @@ class Skybox(Gearoenix.Asset):
     TYPE_CUBE = 1
     TYPE_EQUIRECTANGULAR = 2
 
+    # (forward, right, up) of the faces in the order of Texture.FACES
+    FACE_BASES = (
+        ((0.0, 0.0, 1.0), (1.0, 0.0, 0.0), (0.0, -1.0, 0.0)),
+        ((0.0, 0.0, -1.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)),
+        ((-1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)),
+        ((1.0, 0.0, 0.0), (0.0, -1.0, 0.0), (0.0, 0.0, 1.0)),
+        ((0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, 1.0)),
+        ((0.0, -1.0, 0.0), (-1.0, 0.0, 0.0), (0.0, 0.0, 1.0)),
+    )
+
+    SH_MAX_WIDTH = 1024
+
     @classmethod
     def init(cls):
         super().init()
@@ -1562,6 +4297,9 @@ class Skybox(Gearoenix.Asset):
         image = image.inputs['Base Color'].links[0].from_node
         if self.TYPE_EQUIRECTANGULAR == self.instance_type:
             self.image_file = bpy.path.abspath(image.image.filepath).strip()
+            self.environment = None
+            self.irradiance = None
+            self.cubes = dict()
         elif self.TYPE_CUBE == self.instance_type:
             self.texture = Gearoenix.Texture.read(image)
             if self.texture is None:
@@ -1571,13 +4309,126 @@ class Skybox(Gearoenix.Asset):
                 Gearoenix.terminate(
                     'texture must be cube for skybox:', blender_object.name)
 
+    def get_environment(self):
+        """Linear RGB of the equirectangular image, decoded once for all profiles"""
+        if self.environment is None:
+            self.environment = numpy.ascontiguousarray(
+                Gearoenix.read_image_pixels(self.image_file)[:, :, :3])
+        return self.environment
+
+    @staticmethod
+    def sample_equirectangular(environment, directions):
+        """Bilinear lookup of unit directions in Blender's equirectangular layout (Z up)"""
+        (height, width) = environment.shape[:2]
+        u = (0.5 - numpy.arctan2(directions[..., 1], directions[..., 0]) /
+             (2.0 * math.pi)) % 1.0
+        v = 0.5 - numpy.arcsin(numpy.clip(directions[..., 2], -1.0, 1.0)) / math.pi
+        fx = u * width - 0.5
+        fy = v * height - 0.5
+        x0 = numpy.floor(fx)
+        y0 = numpy.floor(fy)
+        tx = (fx - x0)[..., None]
+        ty = (fy - y0)[..., None]
+        x0 = x0.astype(numpy.int64) % width
+        x1 = (x0 + 1) % width
+        y1 = numpy.clip(y0.astype(numpy.int64) + 1, 0, height - 1)
+        y0 = numpy.clip(y0.astype(numpy.int64), 0, height - 1)
+        top = environment[y0, x0] * (1.0 - tx) + environment[y0, x1] * tx
+        bottom = environment[y1, x0] * (1.0 - tx) + environment[y1, x1] * tx
+        return top * (1.0 - ty) + bottom * ty
+
+    @classmethod
+    def make_cube_face(cls, environment, basis, resolution):
+        (forward, right, up) = (numpy.array(b) for b in basis)
+        coords = (numpy.arange(resolution) + 0.5) * (2.0 / resolution) - 1.0
+        a = coords[None, :, None]
+        b = -coords[:, None, None]
+        directions = forward + a * right + b * up
+        directions /= numpy.linalg.norm(directions, axis=2)[..., None]
+        return cls.sample_equirectangular(environment, directions)
+
+    def get_cube(self, resolution):
+        """Converts the environment to cube faces, each face in its own thread"""
+        if resolution not in self.cubes:
+            environment = self.get_environment()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+                self.cubes[resolution] = list(executor.map(
+                    lambda basis: self.make_cube_face(
+                        environment, basis, resolution),
+                    self.FACE_BASES))
+        return self.cubes[resolution]
+
+    def get_irradiance(self):
+        """
+        Projects the environment on order 2 spherical harmonics and convolves
+        it with the clamped cosine, it returns 9 RGB irradiance coefficients.
+        """
+        if self.irradiance is not None:
+            return self.irradiance
+        environment = self.get_environment()
+        while environment.shape[1] > self.SH_MAX_WIDTH:
+            environment = Gearoenix.downsample_image(environment)
+        (height, width) = environment.shape[:2]
+        elevation = (0.5 - (numpy.arange(height) + 0.5) / height) * math.pi
+        azimuth = (0.5 - (numpy.arange(width) + 0.5) / width) * 2.0 * math.pi
+        cos_elevation = numpy.cos(elevation)[:, None]
+        x = cos_elevation * numpy.cos(azimuth)[None, :]
+        y = cos_elevation * numpy.sin(azimuth)[None, :]
+        z = numpy.repeat(numpy.sin(elevation)[:, None], width, axis=1)
+        solid_angle = (2.0 * math.pi / width) * (math.pi / height) * cos_elevation
+        weighted = environment * solid_angle[..., None]
+        basis = (
+            (math.pi, 0.282095 * numpy.ones_like(x)),
+            (2.0 * math.pi / 3.0, 0.488603 * y),
+            (2.0 * math.pi / 3.0, 0.488603 * z),
+            (2.0 * math.pi / 3.0, 0.488603 * x),
+            (math.pi / 4.0, 1.092548 * x * y),
+            (math.pi / 4.0, 1.092548 * y * z),
+            (math.pi / 4.0, 0.315392 * (3.0 * z * z - 1.0)),
+            (math.pi / 4.0, 1.092548 * x * z),
+            (math.pi / 4.0, 0.546274 * (x * x - y * y)),
+        )
+        self.irradiance = [band * (weighted * b[..., None]).sum(axis=(0, 1))
+                           for (band, b) in basis]
+        return self.irradiance
+
+    def write_cube(self):
+        """
+        Writes the baked faces as RGBE images in the encoding and mipmap policy of
+        cube textures of the profile, block compression does not keep the shared
+        exponent so it falls back to PNG.
+        """
+        quality = Gearoenix.PROFILE.textures[Gearoenix.Profile.ROLE_CUBE]
+        resolution = min(Gearoenix.PROFILE.baked_skybox_cube_res, quality.max_resolution)
+        encoding = quality.encoding
+        if encoding not in (Gearoenix.Texture.ENCODING_PNG, Gearoenix.Texture.ENCODING_RAW):
+            encoding = Gearoenix.Texture.ENCODING_PNG
+        faces = []
+        for face in self.get_cube(resolution):
+            levels = [face]
+            if quality.mips == Gearoenix.Texture.MIPS_BAKED:
+                while levels[-1].shape[0] > 1:
+                    levels.append(Gearoenix.downsample_image(levels[-1]))
+            faces.append(levels)
+        Gearoenix.write_u16(resolution)
+        Gearoenix.write_u8(encoding)
+        Gearoenix.write_u8(len(faces[0]))
+        for levels in faces:
+            for level in levels:
+                rgbe = Gearoenix.encode_rgbe(level)
+                if encoding == Gearoenix.Texture.ENCODING_PNG:
+                    Gearoenix.write_file(Gearoenix.encode_png(rgbe))
+                else:
+                    Gearoenix.write_file(rgbe.tobytes())
+
     def write(self):
         super().write()
         if self.TYPE_EQUIRECTANGULAR == self.instance_type:
-            (env, irr, rad) = Gearoenix.create_sky_resources(self.image_file)
-            Gearoenix.write_file_content(env.filename)
-            Gearoenix.write_file_content(irr.filename)
-            Gearoenix.write_file_content(rad.filename)
+            self.write_cube()
+            for coefficient in self.get_irradiance():
+                Gearoenix.write_vector(coefficient)
+            radiance = Gearoenix.create_sky_radiance(self.image_file)
+            Gearoenix.write_file_content(radiance.filename)
         elif self.TYPE_CUBE == self.instance_type:
             Gearoenix.write_id(self.texture.instance_id)
 
@@ -1595,6 +4446,8 @@ class Reflection(Gearoenix.Asset):
         cls.BAKED_PREFIX = cls.get_prefix() + 'baked-'
         cls.RUNTIME_PREFIX = cls.get_prefix() + 'runtime-'
 
+    ATT_BLEND_DISTANCE = 'blend-distance'
+
     def __init__(self, blender_object):
         super().__init__(blender_object)
         if blender_object.name.startswith(self.BAKED_PREFIX):
@@ -1604,24 +4457,625 @@ class Reflection(Gearoenix.Asset):
         else:
             Gearoenix.terminate(
                 'Unspecified reflection probe type, in:', blender_object.name)
-        Gearoenix.terminate("Unimplemented")
+        if blender_object.type != 'EMPTY':
+            Gearoenix.terminate(
+                'Reflection probe must be an empty object:', blender_object.name)
+        self.blend_distance = Gearoenix.REFLECTION_BLEND_DISTANCE
+        if self.ATT_BLEND_DISTANCE in blender_object:
+            self.blend_distance = float(blender_object[self.ATT_BLEND_DISTANCE])
+        size = blender_object.empty_display_size
+        self.influence = Gearoenix.Aabb()
+        for x in (-size, size):
+            for y in (-size, size):
+                for z in (-size, size):
+                    self.influence.put(
+                        blender_object.matrix_world @ mathutils.Vector((x, y, z)))
+        self.scene_name = None
+        self.models = []
+
+    def touches(self, box):
+        if box.is_empty():
+            return False
+        return all(box.lower[i] <= self.influence.upper[i] and
+                   box.upper[i] >= self.influence.lower[i] for i in range(3))
+
+    @classmethod
+    def compute_influences(cls):
+        """Links probes with the models and instance groups whose world box intersects their influence box"""
+        for scene in Gearoenix.Scene.instances.values():
+            for probe in scene.reflections:
+                probe.scene_name = scene.blender_object.name
+                for model in scene.get_all_models():
+                    if probe.touches(model.get_world_box()):
+                        probe.models.append(model)
+                for group in scene.instance_groups:
+                    if probe.touches(group.get_box()):
+                        group.probes.append(probe)
 
     def write(self):
         super().write()
-        if self.TYPE_RUNTIME == self.instance_type:
-            pass
-        elif self.TYPE_BAKED == self.instance_type:
-            pass
-        Gearoenix.terminate("Unimplemented")
+        self.influence.write()
+        Gearoenix.write_float(self.blend_distance)
+        Gearoenix.write_instances_ids(self.models)
+        resolution = Gearoenix.PROFILE.reflection_res
+        Gearoenix.write_u16(resolution)
+        if self.TYPE_BAKED == self.instance_type:
+            position = self.blender_object.matrix_world.translation
+            Gearoenix.write_file(Gearoenix.capture_reflection(
+                self.scene_name, tuple(position), resolution))
 
 
 Gearoenix.Reflection = Reflection
 
 
+class Pvs:
+    """
+    Potentially visible set of a game scene. Items are the models of the scene in
+    get_all_models order followed by its instance groups. Static geometry is
+    voxelized, every cell of the grid that has walkable space (empty voxels at most
+    an agent height above a static surface) shoots at most PVS_MAX_RAYS_PER_CELL
+    rays from those voxels to the voxels of each static item and marks the first
+    hit of each ray as visible. Dynamic models are always visible.
+    """
+    EMPTY = -1
+    # Upper bound of lattice points that are voxelized at once
+    POINTS_CHUNK = 1 << 20
+    WORKER_MODULE = 'gearoenix_pvs_worker'
+    # Spawned workers can not import this add-on because it needs bpy, so they get
+    # a module made of the source of sample_cell, the grid and the targets once and
+    # every job only carries the origins of a cell and its seed
+    WORKER_BOOTSTRAP = """
+import sys
+import types
+module = types.ModuleType(NAME)
+exec(SOURCE, module.__dict__)
+(module.GRID, module.TARGETS, module.MAX_RAYS) = ARGUMENTS
+sys.modules[NAME] = module
+"""
+    WORKER_SAMPLE = """
+def sample(origins, seed):
+    return sample_cell(GRID, TARGETS, origins, MAX_RAYS, seed)
+"""
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.models = scene.get_all_models()
+        self.items_count = len(self.models) + len(scene.instance_groups)
+        self.cells = []
+        placements = []
+        for (i, model) in enumerate(self.models):
+            if model.instance_type == model.TYPE_STATIC:
+                for mesh in model.meshes:
+                    placements.append((i, model.matrix, mesh))
+        for (i, group) in enumerate(scene.instance_groups):
+            for model in group.models:
+                placements.append((len(self.models) + i, model.matrix, group.mesh))
+        self.always_visible = [i for (i, m) in enumerate(self.models)
+                               if m.instance_type != m.TYPE_STATIC]
+        if len(placements) > 0:
+            self.voxelize(placements)
+            self.bake()
+
+    def voxelize(self, placements):
+        triangles = []
+        labels = []
+        for (item, matrix, mesh) in placements:
+            (positions, _, indices) = mesh.get_origin().get_arrays()
+            matrix = Gearoenix.to_numpy_matrix(matrix)
+            world = positions @ matrix[:3, :3].T + matrix[:3, 3]
+            triangles.append(world[indices])
+            labels.append(numpy.full(len(indices), item, dtype=numpy.int32))
+        triangles = numpy.concatenate(triangles)
+        labels = numpy.concatenate(labels)
+        lower = triangles.min(axis=(0, 1))
+        upper = triangles.max(axis=(0, 1))
+        self.voxel_size = max(Gearoenix.PVS_VOXEL_SIZE,
+                              float((upper - lower).max()) / Gearoenix.PVS_MAX_VOXELS)
+        self.lower = lower - self.voxel_size
+        self.dimensions = numpy.ceil(
+            (upper + self.voxel_size - self.lower) / self.voxel_size).astype(numpy.int64)
+        self.grid = numpy.full(tuple(self.dimensions), self.EMPTY, dtype=numpy.int32)
+        # Every triangle is sampled on a barycentric lattice finer than half of a voxel,
+        # the voxel size limit bounds the lattice of one triangle and batches are bounded
+        # by POINTS_CHUNK, so memory does not grow with the level size
+        edges = numpy.linalg.norm(triangles - numpy.roll(triangles, 1, axis=1), axis=2).max(axis=1)
+        divisions = numpy.ceil(edges / (self.voxel_size * 0.5)).astype(numpy.int64) + 1
+        for n in numpy.unique(divisions):
+            selected = numpy.nonzero(divisions == n)[0]
+            (u, v) = numpy.meshgrid(numpy.arange(n + 1), numpy.arange(n + 1), indexing='ij')
+            inside = u + v <= n
+            u = u[inside] / float(n)
+            v = v[inside] / float(n)
+            batch = max(1, self.POINTS_CHUNK // len(u))
+            for first in range(0, len(selected), batch):
+                chosen = selected[first:first + batch]
+                t = triangles[chosen]
+                points = t[:, None, 0] + (t[:, None, 1] - t[:, None, 0]) * u[None, :, None] + \
+                    (t[:, None, 2] - t[:, None, 0]) * v[None, :, None]
+                voxels = self.to_voxels(points.reshape(-1, 3))
+                self.grid[tuple(voxels.T)] = numpy.repeat(labels[chosen], len(u))
+
+    def to_voxels(self, points):
+        voxels = numpy.floor((points - self.lower) / self.voxel_size).astype(numpy.int64)
+        return numpy.clip(voxels, 0, self.dimensions - 1)
+
+    def find_viewpoints(self):
+        """Empty voxels that an agent standing on a static surface can see from"""
+        occupied = self.grid != self.EMPTY
+        height = max(int(math.ceil(Gearoenix.NAVMESH_AGENT_HEIGHT / self.voxel_size)), 1)
+        supported = numpy.zeros_like(occupied)
+        for z in range(1, min(height, occupied.shape[2] - 1) + 1):
+            supported[:, :, z:] |= occupied[:, :, :-z]
+        viewpoints = numpy.argwhere(supported & ~occupied)
+        if len(viewpoints) == 0:
+            Gearoenix.log_info('PVS of', self.scene.name, 'has no walkable space,',
+                               'all of the empty voxels are used as viewpoints')
+            viewpoints = numpy.argwhere(~occupied)
+        return viewpoints
+
+    def bake(self):
+        cell_voxels = max(int(round(Gearoenix.PVS_CELL_SIZE / self.voxel_size)), 1)
+        self.cell_size = cell_voxels * self.voxel_size
+        self.cell_dimensions = (self.dimensions + cell_voxels - 1) // cell_voxels
+        random = numpy.random.default_rng(0)
+        viewpoints = self.find_viewpoints()
+        cells = viewpoints // cell_voxels
+        cells = (cells[:, 2] * self.cell_dimensions[1] + cells[:, 1]) * self.cell_dimensions[0] + cells[:, 0]
+        jobs = [(int(cell), voxels) for (cell, voxels) in self.pick_per_group(
+            random, viewpoints, cells, Gearoenix.PVS_ORIGINS_PER_CELL)]
+        occupied = numpy.argwhere(self.grid != self.EMPTY)
+        targets = numpy.concatenate([voxels for (_, voxels) in self.pick_per_group(
+            random, occupied, self.grid[tuple(occupied.T)], Gearoenix.PVS_RAYS_PER_ITEM)])
+        Gearoenix.log_info('PVS of', self.scene.name, 'has', len(jobs), 'cells and',
+                           len(targets), 'targets')
+        results = self.sample_cells(jobs, targets)
+        for ((cell, _), visible) in zip(jobs, results):
+            bits = numpy.zeros(self.items_count, dtype=numpy.uint8)
+            bits[visible] = 1
+            bits[self.always_visible] = 1
+            self.cells.append((cell, self.compress(numpy.packbits(bits, bitorder='little'))))
+
+    def sample_cells(self, jobs, targets):
+        """Samples the jobs in spawned processes, or in threads when they can not start"""
+        origins = [o for (_, o) in jobs]
+        seeds = [c for (c, _) in jobs]
+        try:
+            source = textwrap.dedent(inspect.getsource(Pvs.sample_cell))
+            source = 'import numpy\n' + source[source.index('def '):] + self.WORKER_SAMPLE
+            names = {
+                'NAME': self.WORKER_MODULE,
+                'SOURCE': source,
+                'ARGUMENTS': (self.grid, targets, Gearoenix.PVS_MAX_RAYS_PER_CELL),
+            }
+            # The parent needs the module too, jobs pickle its sample by reference
+            exec(self.WORKER_BOOTSTRAP, dict(names))
+            sample = sys.modules[self.WORKER_MODULE].sample
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=exec, initargs=(self.WORKER_BOOTSTRAP, names)) as executor:
+                return list(executor.map(sample, origins, seeds, chunksize=4))
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+            Gearoenix.log_info('PVS worker processes failed (', e, '), sampling in threads')
+        finally:
+            sys.modules.pop(self.WORKER_MODULE, None)
+        # The ray marching is numpy work that releases GIL
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            return list(executor.map(
+                lambda o, s: Pvs.sample_cell(self.grid, targets, o,
+                                             Gearoenix.PVS_MAX_RAYS_PER_CELL, s),
+                origins, seeds))
+
+    @staticmethod
+    def pick_per_group(random, values, groups, count):
+        """Yields (group, at most count random rows of values in that group) sorted by group"""
+        order = random.permutation(len(values))
+        order = order[numpy.argsort(groups[order], kind='stable')]
+        (unique, starts) = numpy.unique(groups[order], return_index=True)
+        ends = numpy.append(starts[1:], len(order))
+        for (group, start, end) in zip(unique, starts, ends):
+            yield (group, values[order[start:min(end, start + count)]])
+
+    @staticmethod
+    def sample_cell(grid, targets, origins, max_rays, seed):
+        """
+        Returns the items that rays from origins of the cell to targets hit first,
+        at most max_rays of the origin target pairs are chosen randomly by seed.
+        It runs in spawned workers too, so it must only use numpy.
+        """
+        empty = -1  # Pvs.EMPTY
+        chunk = 1024  # rays that are marched at once
+        dimensions = numpy.array(grid.shape)
+        count = len(origins) * len(targets)
+        if count > max_rays:
+            pairs = numpy.sort(numpy.random.default_rng(seed).choice(count, max_rays, replace=False))
+        else:
+            pairs = numpy.arange(count)
+        starts = origins[pairs // len(targets)] + 0.5
+        ends = targets[pairs % len(targets)] + 0.5
+        visible = set()
+        for first in range(0, len(starts), chunk):
+            s = starts[first:first + chunk]
+            e = ends[first:first + chunk]
+            d = e - s
+            lengths = numpy.linalg.norm(d, axis=1)
+            steps = numpy.arange(0.0, float(lengths.max()) + 0.5, 0.5)
+            points = s[:, None, :] + d[:, None, :] * \
+                (steps[None, :] / numpy.maximum(lengths, 1e-9)[:, None])[:, :, None]
+            voxels = numpy.clip(numpy.floor(points).astype(numpy.int64), 0, dimensions - 1)
+            hits = grid[voxels[..., 0], voxels[..., 1], voxels[..., 2]]
+            hits[steps[None, :] > lengths[:, None] + 1.0] = empty
+            is_hit = hits != empty
+            has_hit = is_hit.any(axis=1)
+            first_hits = hits[numpy.arange(len(hits)), is_hit.argmax(axis=1)][has_hit]
+            visible.update(int(h) for h in numpy.unique(first_hits))
+        return sorted(visible)
+
+    @staticmethod
+    def compress(data):
+        """Run length encoding of zero bytes, a zero is followed by its run length"""
+        result = bytearray()
+        i = 0
+        while i < len(data):
+            if data[i] != 0:
+                result.append(data[i])
+                i += 1
+                continue
+            run = 1
+            while run < 255 and i + run < len(data) and data[i + run] == 0:
+                run += 1
+            result.append(0)
+            result.append(run)
+            i += run
+        return bytes(result)
+
+    def write(self):
+        Gearoenix.write_count(self.items_count)
+        Gearoenix.write_count(len(self.cells))
+        if len(self.cells) == 0:
+            return
+        Gearoenix.write_vector(self.lower)
+        Gearoenix.write_float(self.cell_size)
+        for d in self.cell_dimensions:
+            Gearoenix.write_u32(d)
+        for (index, data) in self.cells:
+            Gearoenix.write_u32(index)
+            Gearoenix.write_file(data)
+
+
+Gearoenix.Pvs = Pvs
+
+
+class Navmesh:
+    """
+    Tiled polygon navigation mesh of a game scene, an adaptation of Recast:
+    static surfaces are rasterized into a voxel heightfield whose spans are merged
+    with the rules of Recast, surface voxels with a gentle slope and enough
+    clearance become walkable nodes and nodes near the borders are eroded by the
+    agent radius. Instead of the watershed regions and traced contours of Recast,
+    the nodes of each tile are greedily merged into nearly flat rectangles, that
+    are more polygons but need no contour simplification or triangulation.
+    Polygons are connected through portals on their shared edges.
+    """
+    EMPTY = 0
+    SOLID = 1
+    WALKABLE = 2
+    POINTS_CHUNK = 1 << 20
+
+    DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+    # Corner offsets of the cell edge that faces each of DIRECTIONS
+    PORTAL_EDGES = (((1, 0), (1, 1)), ((1, 1), (0, 1)), ((0, 1), (0, 0)), ((0, 0), (1, 0)))
+
+    def __init__(self, scene):
+        self.polygons = []
+        self.tiles = []
+        triangles = []
+        for (model, mesh) in scene.get_placed_meshes():
+            if model.instance_type != model.TYPE_STATIC:
+                continue
+            (positions, _, indices) = mesh.get_origin().get_arrays()
+            matrix = Gearoenix.to_numpy_matrix(model.matrix)
+            world = positions @ matrix[:3, :3].T + matrix[:3, 3]
+            triangles.append(world[indices])
+        if len(triangles) == 0:
+            return
+        self.cell_size = Gearoenix.NAVMESH_CELL_SIZE
+        self.cell_height = Gearoenix.NAVMESH_CELL_HEIGHT
+        self.climb = int(math.floor(Gearoenix.NAVMESH_AGENT_MAX_CLIMB / self.cell_height))
+        self.rasterize(numpy.concatenate(triangles))
+        self.find_walkable()
+        self.erode(int(math.ceil(Gearoenix.NAVMESH_AGENT_RADIUS / self.cell_size)))
+        self.build_polygons()
+        self.connect_polygons()
+        Gearoenix.log_info('Navmesh of', scene.name, 'has', len(self.polygons),
+                           'polygons in', len(self.tiles), 'tiles')
+
+    def rasterize(self, triangles):
+        lower = triangles.min(axis=(0, 1))
+        upper = triangles.max(axis=(0, 1))
+        self.lower = lower
+        scale = numpy.array((self.cell_size, self.cell_size, self.cell_height))
+        self.dimensions = numpy.floor((upper - lower) / scale).astype(numpy.int64) + 1
+        voxels_count = int(numpy.prod(self.dimensions))
+        if voxels_count > Gearoenix.NAVMESH_MAX_VOXELS:
+            Gearoenix.terminate(
+                'Navmesh heightfield of', voxels_count, 'voxels', tuple(self.dimensions),
+                'is bigger than NAVMESH_MAX_VOXELS', Gearoenix.NAVMESH_MAX_VOXELS,
+                ', increase the navmesh cell size or cell height.')
+        normals = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        lengths = numpy.maximum(numpy.linalg.norm(normals, axis=1), 1e-12)
+        walkable = normals[:, 2] / lengths >= math.cos(math.radians(Gearoenix.NAVMESH_AGENT_MAX_SLOPE))
+        # Highest surface of each label inside each voxel, 0 is none and 1 to 255
+        # are the heights inside the voxel
+        tops = {label: numpy.zeros(tuple(self.dimensions), dtype=numpy.uint8)
+                for label in (self.SOLID, self.WALKABLE)}
+        # Lattice is finer than half of a voxel along every axis
+        cells = triangles / scale
+        edges = numpy.linalg.norm(cells - numpy.roll(cells, 1, axis=1), axis=2).max(axis=1)
+        divisions = numpy.ceil(edges * 2.0).astype(numpy.int64) + 1
+        for n in numpy.unique(divisions):
+            selected = numpy.nonzero(divisions == n)[0]
+            (u, v) = numpy.meshgrid(numpy.arange(n + 1), numpy.arange(n + 1), indexing='ij')
+            inside = u + v <= n
+            u = u[inside] / float(n)
+            v = v[inside] / float(n)
+            batch = max(1, self.POINTS_CHUNK // len(u))
+            for first in range(0, len(selected), batch):
+                chosen = selected[first:first + batch]
+                t = triangles[chosen]
+                points = t[:, None, 0] + (t[:, None, 1] - t[:, None, 0]) * u[None, :, None] + \
+                    (t[:, None, 2] - t[:, None, 0]) * v[None, :, None]
+                points = (points.reshape(-1, 3) - lower) / scale
+                voxels = numpy.clip(numpy.floor(points).astype(numpy.int64), 0, self.dimensions - 1)
+                heights = numpy.clip((points[:, 2] - voxels[:, 2]) * 254.0, 0.0, 254.0).astype(numpy.uint8) + 1
+                is_walkable = numpy.repeat(walkable[chosen], len(u))
+                for (label, chosen_points) in ((self.WALKABLE, is_walkable), (self.SOLID, ~is_walkable)):
+                    numpy.maximum.at(tops[label], tuple(voxels[chosen_points].T), heights[chosen_points])
+        self.merge_spans(tops)
+
+    def merge_spans(self, tops):
+        """
+        Labels voxels like Recast merges the spans of a column: the highest surface
+        of a span of consecutive occupied voxels decides its label, but a walkable
+        surface wins over a higher solid one that is within the agent climb.
+        """
+        climb = Gearoenix.NAVMESH_AGENT_MAX_CLIMB / self.cell_height
+        self.grid = numpy.zeros(tuple(self.dimensions), dtype=numpy.int8)
+        # Highest solid and walkable surfaces of the current span of each column in cells
+        highest = {label: numpy.full(self.grid.shape[:2], -numpy.inf) for label in tops}
+        for z in range(self.grid.shape[2]):
+            occupied = (tops[self.SOLID][:, :, z] > 0) | (tops[self.WALKABLE][:, :, z] > 0)
+            for (label, top) in tops.items():
+                height = numpy.where(top[:, :, z] > 0, z + top[:, :, z] / 255.0, -numpy.inf)
+                highest[label] = numpy.where(occupied, numpy.maximum(highest[label], height), -numpy.inf)
+            self.grid[:, :, z] = numpy.where(
+                occupied, numpy.where(highest[self.WALKABLE] >= highest[self.SOLID] - climb,
+                                      self.WALKABLE, self.SOLID), self.EMPTY)
+
+    def find_walkable(self):
+        """Walkable surface voxels that have the agent height free above them"""
+        height = int(math.ceil(Gearoenix.NAVMESH_AGENT_HEIGHT / self.cell_height))
+        self.walkable = numpy.zeros(self.grid.shape, dtype=bool)
+        # Free voxels above each column is kept for one layer at a time
+        above = numpy.full(self.grid.shape[:2], height, dtype=numpy.int32)
+        for z in range(self.grid.shape[2] - 1, -1, -1):
+            self.walkable[:, :, z] = (self.grid[:, :, z] == self.WALKABLE) & (above >= height)
+            above = numpy.where(self.grid[:, :, z] == self.EMPTY, above + 1, 0)
+
+    @staticmethod
+    def shift(a, dx, dy):
+        """result[x, y] = a[x + dx, y + dy] and False outside"""
+        result = numpy.zeros(a.shape, dtype=bool)
+        (w, h) = a.shape[:2]
+        result[max(-dx, 0):w - max(dx, 0), max(-dy, 0):h - max(dy, 0)] = \
+            a[max(dx, 0):w - max(-dx, 0), max(dy, 0):h - max(-dy, 0)]
+        return result
+
+    def get_reachable(self, walkable):
+        """reachable[x, y, z] is True if a walkable voxel is within climb height of z"""
+        reachable = walkable.copy()
+        for dz in range(1, self.climb + 1):
+            reachable[:, :, dz:] |= walkable[:, :, :-dz]
+            reachable[:, :, :-dz] |= walkable[:, :, dz:]
+        return reachable
+
+    def erode(self, radius):
+        for _ in range(radius):
+            reachable = self.get_reachable(self.walkable)
+            inner = self.walkable.copy()
+            for (dx, dy) in self.DIRECTIONS:
+                inner &= self.shift(reachable, dx, dy)
+            self.walkable = inner
+
+    def find_neighbours(self, keys):
+        """
+        Index of the walkable node of the next column in each direction that is
+        nearest to the height of each node within climb, or -1
+        """
+        (_, h, d) = self.dimensions
+        (x, y, z) = self.nodes.T
+        result = []
+        for (dx, dy) in self.DIRECTIONS:
+            found = numpy.full(len(self.nodes), -1, dtype=numpy.int64)
+            inside = (x + dx >= 0) & (y + dy >= 0) & \
+                (x + dx < self.dimensions[0]) & (y + dy < h)
+            for dz in sorted(range(-self.climb, self.climb + 1), key=abs):
+                wanted = ((x + dx) * h + y + dy) * d + z + dz
+                at = numpy.minimum(numpy.searchsorted(keys, wanted), len(keys) - 1)
+                hit = inside & (found < 0) & (z + dz >= 0) & (z + dz < d) & (keys[at] == wanted)
+                found[hit] = at[hit]
+            result.append(found)
+        return result
+
+    def build_polygons(self):
+        """Greedy nearly flat rectangles of walkable voxels inside each tile"""
+        size = Gearoenix.NAVMESH_TILE_SIZE
+        # Sorted by column and height, as argwhere returns them in C order
+        self.nodes = numpy.argwhere(self.walkable)
+        (_, h, d) = self.dimensions
+        self.neighbours = self.find_neighbours((self.nodes[:, 0] * h + self.nodes[:, 1]) * d + self.nodes[:, 2])
+        self.owners = numpy.full(len(self.nodes), -1, dtype=numpy.int64)
+        # Rows and columns of rectangles do not leave their tile, a trailing -1 lets
+        # the index -1 map to -1
+        next_x = numpy.append(numpy.where((self.nodes[:, 0] + 1) % size == 0, -1, self.neighbours[0]), -1)
+        next_y = numpy.append(numpy.where((self.nodes[:, 1] + 1) % size == 0, -1, self.neighbours[1]), -1)
+        tiles = self.nodes[:, :2] // size
+        # Tiles row by row and the nodes of each tile by height, y and x
+        order = numpy.lexsort((self.nodes[:, 0], self.nodes[:, 1], self.nodes[:, 2], tiles[:, 0], tiles[:, 1]))
+        starts = numpy.flatnonzero(numpy.any(numpy.diff(tiles[order], axis=0) != 0, axis=1)) + 1
+        starts = numpy.insert(starts, 0, 0) if len(order) > 0 else starts
+        ends = numpy.append(starts[1:], len(order))
+        local = numpy.zeros(len(self.nodes), dtype=numpy.int64)
+        for (start, end) in zip(starts, ends):
+            members = order[start:end]
+            # paths[i, k] is the node k steps after the member i along x
+            paths = numpy.empty((len(members), size), dtype=numpy.int64)
+            paths[:, 0] = members
+            for k in range(1, size):
+                paths[:, k] = next_x[paths[:, k - 1]]
+            local[members] = numpy.arange(len(members))
+            first = len(self.polygons)
+            for seed in members:
+                if self.owners[seed] < 0:
+                    self.polygons.append(self.grow_rectangle(seed, paths, local, next_y))
+            (x, y) = tiles[members[0]]
+            self.tiles.append(((int(x), int(y)), first, len(self.polygons) - first))
+
+    def grow_rectangle(self, seed, paths, local, next_y):
+        index = len(self.polygons)
+        heights = self.nodes[:, 2]
+        z0 = heights[seed]
+
+        def take_row(start, width):
+            row = paths[local[start], :width]
+            valid = (row >= 0) & (self.owners[row] < 0) & (numpy.abs(heights[row] - z0) <= self.climb)
+            return row if valid.all() else row[:int(numpy.argmin(valid))]
+
+        rows = [take_row(seed, paths.shape[1])]
+        width = len(rows[0])
+        while next_y[rows[-1][0]] >= 0:
+            row = take_row(next_y[rows[-1][0]], width)
+            if len(row) < width or (numpy.abs(heights[row] - heights[rows[-1]]) > self.climb).any():
+                break
+            rows.append(row)
+        self.owners[numpy.concatenate(rows)] = index
+        (x, y, _) = self.nodes[seed]
+        return {'x': int(x), 'y': int(y), 'rows': [heights[row].tolist() for row in rows], 'links': []}
+
+    def get_position(self, x, y, z):
+        return (float(self.lower[0] + x * self.cell_size),
+                float(self.lower[1] + y * self.cell_size),
+                float(self.lower[2] + (z + 1) * self.cell_height))
+
+    def get_corners(self, polygon):
+        (x, y, rows) = (polygon['x'], polygon['y'], polygon['rows'])
+        (w, h) = (len(rows[0]), len(rows))
+        return [self.get_position(x, y, rows[0][0]),
+                self.get_position(x + w, y, rows[0][-1]),
+                self.get_position(x + w, y + h, rows[-1][-1]),
+                self.get_position(x, y + h, rows[-1][0])]
+
+    def connect_polygons(self):
+        """Links every pair of polygons that have walkable voxels across their shared edge"""
+        (owners, others, starts, ends, heights) = ([], [], [], [], [])
+        # Points are keyed by x * stride + y so the lexicographic order is kept
+        stride = int(self.dimensions[1]) + 2
+        for (edge, found) in zip(self.PORTAL_EDGES, self.neighbours):
+            other = numpy.where(found >= 0, self.owners[found], -1)
+            linked = numpy.nonzero((other >= 0) & (other != self.owners))[0]
+            (x, y, z) = self.nodes[linked].T
+            points = [(x + ex) * stride + y + ey for (ex, ey) in edge]
+            owners.append(self.owners[linked])
+            others.append(other[linked])
+            starts.append(numpy.minimum(*points))
+            ends.append(numpy.maximum(*points))
+            heights.append(z)
+        (owners, others, starts, ends, heights) = (numpy.concatenate(a) for a in (
+            owners, others, starts, ends, heights))
+        if len(owners) == 0:
+            return
+        order = numpy.lexsort((others, owners))
+        pairs = owners[order] * len(self.polygons) + others[order]
+        (_, firsts) = numpy.unique(pairs, return_index=True)
+        starts = numpy.minimum.reduceat(starts[order], firsts)
+        ends = numpy.maximum.reduceat(ends[order], firsts)
+        heights = numpy.maximum.reduceat(heights[order], firsts)
+        for (i, start, end, z) in zip(order[firsts], starts, ends, heights):
+            self.polygons[owners[i]]['links'].append(
+                (int(others[i]), self.get_position(start // stride, start % stride, z),
+                 self.get_position(end // stride, end % stride, z)))
+
+    def write(self):
+        Gearoenix.write_count(len(self.polygons))
+        if len(self.polygons) == 0:
+            return
+        Gearoenix.write_vector(self.lower)
+        Gearoenix.write_float(self.cell_size)
+        Gearoenix.write_float(self.cell_height)
+        Gearoenix.write_u32(Gearoenix.NAVMESH_TILE_SIZE)
+        Gearoenix.write_count(len(self.tiles))
+        for ((x, y), first, count) in self.tiles:
+            Gearoenix.write_u32(x)
+            Gearoenix.write_u32(y)
+            Gearoenix.write_u32(first)
+            Gearoenix.write_u32(count)
+        for polygon in self.polygons:
+            for corner in self.get_corners(polygon):
+                Gearoenix.write_vector(corner)
+            Gearoenix.write_count(len(polygon['links']))
+            for (other, start, end) in polygon['links']:
+                Gearoenix.write_u32(other)
+                Gearoenix.write_vector(start)
+                Gearoenix.write_vector(end)
+
+
+Gearoenix.Navmesh = Navmesh
+
+
+class InstanceGroup:
+    """Static models of a scene that are drawn as instances of one mesh with one material"""
+
+    def __init__(self, models):
+        self.models = models
+        self.mesh = models[0].meshes[0]
+        self.lights = []
+        self.probes = []
+
+    def get_box(self):
+        box = Gearoenix.Aabb()
+        for model in self.models:
+            box.put_box(model.get_world_box())
+        return box
+
+    def write(self):
+        Gearoenix.write_id(self.mesh.instance_id)
+        Gearoenix.write_id(self.mesh.mat.instance_id)
+        Gearoenix.write_instances_ids(self.lights)
+        Gearoenix.write_instances_ids(self.probes)
+        self.get_box().write()
+        Gearoenix.write_count(len(self.models))
+        for model in self.models:
+            Gearoenix.write_affine(model.matrix)
+            model.get_world_box().write()
+
+
+Gearoenix.InstanceGroup = InstanceGroup
+
+
 class Scene(Gearoenix.Asset):
     TYPE_GAME = 1
     TYPE_UI = 2
 
+    PASS_OPAQUE = 0
+    PASS_ALPHA_CLIP = 1
+    PASS_BLEND = 2
+    PASS_SHADOW = 3
+
+    DRAW_MODEL = 1
+    DRAW_INSTANCE_GROUP = 2
+
+    NO_PARENT = 0xFFFFFFFF
+
     @classmethod
     def init(cls):
         super().init()
@@ -1637,6 +5091,9 @@ class Scene(Gearoenix.Asset):
         self.audios = []
         self.constraints = []
         self.reflections = []
+        self.instance_groups = []
+        self.pvs = None
+        self.navmesh = None
         for o in blender_object.objects:
             if o.parent is not None:
                 continue
@@ -1691,6 +5148,273 @@ class Scene(Gearoenix.Asset):
         Gearoenix.write_instances_ids(self.skyboxes)
         Gearoenix.write_instances_ids(self.reflections)
         Gearoenix.write_instances_ids(self.constraints)
+        self.write_bvh()
+        Gearoenix.write_count(len(self.instance_groups))
+        for group in self.instance_groups:
+            group.write()
+        self.write_draw_lists()
+        self.write_transforms()
+        if self.pvs is None:
+            Gearoenix.write_bool(False)
+        else:
+            Gearoenix.write_bool(True)
+            self.pvs.write()
+        if self.navmesh is None:
+            Gearoenix.write_bool(False)
+        else:
+            Gearoenix.write_bool(True)
+            self.navmesh.write()
+
+    def instance_models(self):
+        """Replaces childless static root models that share a mesh and an equivalent material with instance groups"""
+        groups = collections.defaultdict(list)
+        for model in self.models:
+            if model.is_instanceable():
+                mesh = model.meshes[0]
+                groups[(mesh.get_origin().name, mesh.mat.get_key())].append(model)
+        instanced = set()
+        for models in groups.values():
+            if len(models) < Gearoenix.INSTANCING_MIN_COUNT:
+                continue
+            self.instance_groups.append(Gearoenix.InstanceGroup(models))
+            instanced.update(models)
+            Gearoenix.log_info('Instance group of', models[0].meshes[0].get_origin().name,
+                               'has', len(models), 'instances')
+        for model in instanced:
+            del Gearoenix.Model.instances[model.name]
+        self.models = [m for m in self.models if m not in instanced]
+
+    @classmethod
+    def build_navmesh_all(cls):
+        for scene in cls.instances.values():
+            if scene.instance_type == cls.TYPE_GAME:
+                scene.navmesh = Gearoenix.Navmesh(scene)
+
+    @classmethod
+    def bake_pvs_all(cls):
+        for scene in cls.instances.values():
+            if scene.instance_type == cls.TYPE_GAME:
+                scene.pvs = Gearoenix.Pvs(scene)
+
+    @classmethod
+    def instance_all(cls):
+        for scene in cls.instances.values():
+            scene.instance_models()
+
+    def get_placed_meshes(self):
+        """(model, mesh) of every drawn mesh, including the models of instance groups"""
+        placed = []
+        for model in self.get_all_models():
+            for mesh in model.meshes:
+                placed.append((model, mesh))
+        for group in self.instance_groups:
+            for model in group.models:
+                placed.append((model, group.mesh))
+        return placed
+
+    def batch_static_models(self):
+        """
+        Merges meshes of childless static root models that have equivalent materials
+        and fall in the same spatial cell into world space meshes of new static models.
+        """
+        groups = collections.defaultdict(list)
+        for model in self.models:
+            if not model.is_batchable():
+                continue
+            box = model.get_world_box()
+            center = (box.lower + box.upper) * 0.5
+            cell = tuple(int(math.floor(c / Gearoenix.BATCH_CELL_SIZE)) for c in center)
+            for mesh in model.meshes:
+                groups[(mesh.mat.get_key(), cell)].append((model, mesh))
+        batched = set()
+        batch_index = 0
+        for (_, members) in sorted(groups.items(), key=lambda kv: kv[1][0][1].name):
+            if len(members) < 2:
+                continue
+            chunks = [[]]
+            vertices_count = 0
+            for (model, mesh) in members:
+                count = len(mesh.get_origin().vertices)
+                if vertices_count + count > Gearoenix.BATCH_MAX_VERTICES and len(chunks[-1]) > 0:
+                    chunks.append([])
+                    vertices_count = 0
+                chunks[-1].append((model, mesh))
+                vertices_count += count
+            for chunk in chunks:
+                if len(chunk) < 2:
+                    continue
+                vertices = []
+                indices = []
+                for (model, mesh) in chunk:
+                    (v, i) = mesh.get_origin().get_baked_vertices(
+                        Gearoenix.to_numpy_matrix(model.matrix))
+                    indices.extend(e + len(vertices) for e in i)
+                    vertices.extend(v)
+                    batched.add(mesh)
+                name = 'batch-' + self.get_reference_name() + '-' + str(batch_index)
+                batch_index += 1
+                mesh = Gearoenix.Mesh.create_generated(name, vertices, indices, chunk[0][1].mat)
+                self.models.append(Gearoenix.Model.create_generated(name, [mesh]))
+                Gearoenix.log_info('Batch', name, 'merged', len(chunk), 'meshes')
+        models = []
+        for model in self.models:
+            meshes = [m for m in model.meshes if m not in batched]
+            if len(meshes) == len(model.meshes):
+                models.append(model)
+            elif len(meshes) > 0:
+                model.meshes = meshes
+                model.world_box = None
+                models.append(model)
+            else:
+                del Gearoenix.Model.instances[model.name]
+        self.models = models
+
+    @classmethod
+    def batch_all(cls):
+        for scene in cls.instances.values():
+            scene.batch_static_models()
+        Gearoenix.Mesh.remove_unused()
+
+    def write_transforms(self):
+        """
+        Writes models in topological order with parent indices and local transforms
+        as position, quaternion (x, y, z, w) and scale arrays, then static flags.
+        """
+        models = self.get_all_models()
+        indices = {m.instance_id: i for (i, m) in enumerate(models)}
+        parents = [self.NO_PARENT for _ in models]
+        for (i, model) in enumerate(models):
+            for child in model.model_children:
+                parents[indices[child.instance_id]] = i
+        transforms = []
+        for (model, parent) in zip(models, parents):
+            matrix = model.matrix
+            if parent != self.NO_PARENT:
+                matrix = models[parent].matrix.inverted() @ matrix
+            transforms.append(matrix.decompose())
+        Gearoenix.write_instances_ids(models)
+        Gearoenix.write_u32_array(parents)
+        for (position, _, _) in transforms:
+            Gearoenix.write_vector(position)
+        for (_, rotation, _) in transforms:
+            for e in (rotation.x, rotation.y, rotation.z, rotation.w):
+                Gearoenix.write_float(e)
+        for (_, _, scale) in transforms:
+            Gearoenix.write_vector(scale)
+        for model in models:
+            Gearoenix.write_bool(model.instance_type == model.TYPE_STATIC)
+
+    def get_draw_items(self):
+        """(kind, model id or instance group index, mesh index in model, mesh) of every draw"""
+        items = []
+        for model in self.get_all_models():
+            for (i, mesh) in enumerate(model.meshes):
+                items.append((self.DRAW_MODEL, model.instance_id, i, mesh))
+        for (i, group) in enumerate(self.instance_groups):
+            items.append((self.DRAW_INSTANCE_GROUP, i, 0, group.mesh))
+        return items
+
+    def write_draw_lists(self):
+        """
+        Writes opaque, alpha clip, blend and shadow caster draw lists sorted by a 64 bit key:
+        pass in bits 62-63, material rank in bits 40-61 and mesh rank in bits 16-39.
+        Ranks keep materials with the same textures and the same meshes adjacent,
+        bits 0-15 are left for the engine, e.g. for depth of blended items.
+        """
+        items = self.get_draw_items()
+        materials = {mesh.mat.get_origin() for (_, _, _, mesh) in items}
+        materials = sorted(materials, key=lambda m: (
+            m.instance_type, tuple(t.get_origin().instance_id for t in m.get_textures()),
+            m.instance_id))
+        material_ranks = {m.instance_id: r for (r, m) in enumerate(materials)}
+        meshes = sorted({mesh.instance_id for (_, _, _, mesh) in items})
+        mesh_ranks = {m: r for (r, m) in enumerate(meshes)}
+        lists = [[] for _ in range(4)]
+        for (kind, item_id, index, mesh) in items:
+            mat = mesh.mat
+            key = (material_ranks[mat.instance_id] << 40) | (mesh_ranks[mesh.instance_id] << 16)
+            if mat.is_tansparent:
+                passes = [self.PASS_BLEND]
+            elif isinstance(mat.alpha, Gearoenix.Texture):
+                passes = [self.PASS_ALPHA_CLIP]
+            else:
+                passes = [self.PASS_OPAQUE]
+            if mat.is_shadow_caster:
+                passes.append(self.PASS_SHADOW)
+            for p in passes:
+                lists[p].append(((p << 62) | key, kind, item_id, index))
+        for draws in lists:
+            draws.sort()
+            Gearoenix.write_count(len(draws))
+            for (key, kind, item_id, index) in draws:
+                Gearoenix.write_u64(key)
+                Gearoenix.write_u8(kind)
+                Gearoenix.write_id(item_id)
+                Gearoenix.write_u32(index)
+
+    def get_world_box(self):
+        box = Gearoenix.Aabb()
+        for group in self.instance_groups:
+            box.put_box(group.get_box())
+        for model in self.models:
+            box.put_box(model.get_world_box())
+        for c in self.constraints:
+            for model in c.model_children:
+                box.put_box(model.get_world_box())
+        return box
+
+    def write_bvh(self):
+        """
+        Writes hierarchy of static root models and instance groups, descendants are
+        covered by their parent box. Leaves are (kind, model id or instance group index)
+        with the kinds of draw lists.
+        """
+        models = list(self.models)
+        for c in self.constraints:
+            models.extend(c.model_children)
+        items = [(self.DRAW_MODEL, m.instance_id, m.get_world_box()) for m in models
+                 if m.instance_type == m.TYPE_STATIC]
+        items.extend((self.DRAW_INSTANCE_GROUP, i, g.get_box())
+                     for (i, g) in enumerate(self.instance_groups))
+        items = [item for item in items if not item[2].is_empty()]
+        bvh = Gearoenix.Bvh(
+            [tuple(box.lower) for (_, _, box) in items],
+            [tuple(box.upper) for (_, _, box) in items])
+        bvh.write()
+        Gearoenix.write_count(len(bvh.order))
+        for i in bvh.order:
+            Gearoenix.write_u8(items[i][0])
+            Gearoenix.write_id(items[i][1])
+
+    def get_pixels_per_unit(self):
+        """Highest screen pixels per world unit that a surface of scene can reach"""
+        if self.instance_type == self.TYPE_UI:
+            box = self.get_world_box()
+            extent = max(box.upper.x - box.lower.x, box.upper.y - box.lower.y)
+            return Gearoenix.STREAMING_SCREEN_SIZE / max(extent, Gearoenix.EPSILON)
+        pixels_per_unit = Gearoenix.EPSILON
+        for camera in self.cameras:
+            cam = camera.blender_object.data
+            if camera.instance_type == camera.TYPE_PERSPECTIVE:
+                distance = max(cam.clip_start, Gearoenix.STREAMING_MIN_DISTANCE)
+                width = 2.0 * distance * math.tan(cam.angle_x * 0.5)
+            else:
+                width = cam.ortho_scale
+            pixels_per_unit = max(
+                pixels_per_unit, Gearoenix.STREAMING_SCREEN_SIZE / width)
+        return pixels_per_unit
+
+    def get_all_models(self):
+        """Models of scene and all of their descendants"""
+        models = []
+        stack = list(reversed(self.models))
+        for c in reversed(self.constraints):
+            stack.extend(reversed(c.model_children))
+        while len(stack) > 0:
+            model = stack.pop()
+            models.append(model)
+            stack.extend(reversed(model.model_children))
+        return models
 
     @classmethod
     def read_all(cls):
@@ -1720,6 +5444,75 @@ class Exporter(bpy.types.Operator, bpy_extras.io_utils.ExportHelper):
             (str(Gearoenix.ENGINE_VULKUST), 'Vulkust', ''),
         ),
     )
+    export_profiles: bpy.props.EnumProperty(
+        name='Profiles',
+        description='A gx3d file is exported for each selected platform profile',
+        options={'ENUM_FLAG'},
+        items=tuple((p.name, p.name.capitalize(), '')
+                    for p in Gearoenix.PROFILES),
+        default={Gearoenix.PROFILES[0].name},
+    )
+    export_atlas: bpy.props.BoolProperty(
+        name='Texture atlas',
+        description='Packs small textures of UI scenes into atlases',
+        default=False,
+    )
+    light_cutoff: bpy.props.FloatProperty(
+        name='Light cutoff',
+        description='Intensity that the range of point lights ends at',
+        default=Gearoenix.LIGHT_CUTOFF,
+        min=1e-6,
+    )
+    pvs: bpy.props.BoolProperty(
+        name='Potentially visible sets',
+        description='Bakes cell to model visibility of game scenes, it may take minutes',
+        default=False,
+    )
+    navmesh: bpy.props.BoolProperty(
+        name='Navigation meshes',
+        description='Builds navigation meshes of game scenes from their static models',
+        default=False,
+    )
+    instancing: bpy.props.BoolProperty(
+        name='Instancing',
+        description='Writes static models that share a mesh and material as instance groups',
+        default=False,
+    )
+    static_batching: bpy.props.BoolProperty(
+        name='Static batching',
+        description='Merges meshes of near static models with equivalent materials',
+        default=False,
+    )
+    auto_convex_collider: bpy.props.BoolProperty(
+        name='Automatic convex colliders',
+        description='Dynamic models without collider get convex hulls of their meshes',
+        default=False,
+    )
+    compact: bpy.props.BoolProperty(
+        name='Compact',
+        description='Writes counts and ids as varints, id lists as deltas and names in a shared pool',
+        default=False,
+    )
+    name_hash: bpy.props.BoolProperty(
+        name='Name hash',
+        description='Writes a perfect hash of names for each table, for lookup without allocation',
+        default=False,
+    )
+    split_headers: bpy.props.BoolProperty(
+        name='Split headers',
+        description='Writes a header per asset type and an umbrella header that includes them',
+        default=False,
+    )
+    font_extra_charset: bpy.props.StringProperty(
+        name='Font extra characters',
+        description='Characters that are added to every font atlas, e.g. for runtime edited texts',
+        default=Gearoenix.FONT_EXTRA_CHARSET,
+    )
+    font_embed_ttf: bpy.props.BoolProperty(
+        name='Embed TTF',
+        description='Embeds the font file beside its glyph atlas',
+        default=False,
+    )
 
     def execute(self, context):
         engine = int(self.export_engine)
@@ -1737,6 +5530,22 @@ class Exporter(bpy.types.Operator, bpy_extras.io_utils.ExportHelper):
             Gearoenix.EXPORT_FILE_PATH = self.filepath
         except AttributeError:
             Gearoenix.terminate("Exporter.filepath not found")
+        Gearoenix.EXPORT_PROFILES = [
+            p for p in Gearoenix.PROFILES if p.name in self.export_profiles]
+        if len(Gearoenix.EXPORT_PROFILES) < 1:
+            Gearoenix.terminate('No export profile is selected')
+        Gearoenix.EXPORT_ATLAS = self.export_atlas
+        Gearoenix.LIGHT_CUTOFF = self.light_cutoff
+        Gearoenix.EXPORT_PVS = self.pvs
+        Gearoenix.EXPORT_NAVMESH = self.navmesh
+        Gearoenix.EXPORT_INSTANCING = self.instancing
+        Gearoenix.EXPORT_STATIC_BATCHING = self.static_batching
+        Gearoenix.AUTO_CONVEX_COLLIDER = self.auto_convex_collider
+        Gearoenix.EXPORT_SPLIT_HEADERS = self.split_headers
+        Gearoenix.EXPORT_NAME_HASH = self.name_hash
+        Gearoenix.EXPORT_COMPACT = self.compact
+        Gearoenix.FONT_EXTRA_CHARSET = self.font_extra_charset
+        Gearoenix.EXPORT_FONT_TTF = self.font_embed_ttf
         Gearoenix.find_tools()
         Gearoenix.export_files()
         return {'FINISHED'}
@@ -0,0 +1,9 @@
+import os
+import sys
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIRECTORY))
+try:
+    import bpy  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(TESTS_DIRECTORY, 'stubs'))
@@ -0,0 +1,32 @@
+"""Minimal stand-in of Blender module, enough to import the exporter outside of Blender"""
+
+
+class types:
+    class Operator:
+        pass
+
+
+class _Properties:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+props = _Properties()
+
+
+class data:
+    objects = {}
+    scenes = []
+    images = []
+
+
+class path:
+    @staticmethod
+    def abspath(p):
+        return p
+
+
+class utils:
+    @staticmethod
+    def register_class(c):
+        pass
@@ -0,0 +1,78 @@
+"""Minimal stand-in of Blender mathutils module"""
+import numpy
+
+
+class Vector:
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self.values = [float(v) for v in values]
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __setitem__(self, i, v):
+        self.values[i] = float(v)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __add__(self, other):
+        return Vector(a + b for (a, b) in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for (a, b) in zip(self, other))
+
+    def __mul__(self, s):
+        return Vector(a * s for a in self)
+
+    def copy(self):
+        return Vector(self.values)
+
+    def component(i):
+        return property(lambda self: self.values[i],
+                        lambda self, v: self.__setitem__(i, v))
+
+    x = component(0)
+    y = component(1)
+    z = component(2)
+    w = component(3)
+    del component
+
+
+class Matrix:
+    def __init__(self, rows=None):
+        self.m = numpy.eye(4) if rows is None else numpy.array(rows, dtype=numpy.float64)
+
+    @staticmethod
+    def Identity(n):
+        return Matrix(numpy.eye(n))
+
+    def __getitem__(self, i):
+        return self.m[i]
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(self.m @ other.m)
+        v = numpy.array(list(other))
+        if len(v) == 3:
+            return Vector((self.m @ numpy.append(v, 1.0))[:3])
+        return Vector(self.m @ v)
+
+    def inverted(self):
+        return Matrix(numpy.linalg.inv(self.m))
+
+    @property
+    def translation(self):
+        return Vector(self.m[:3, 3])
+
+    def decompose(self):
+        """Position, rotation and scale, only the rotation free matrices are supported"""
+        scale = numpy.linalg.norm(self.m[:3, :3], axis=0)
+        return (self.translation, Quaternion(), Vector(scale))
+
+
+class Quaternion:
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0)):
+        (self.w, self.x, self.y, self.z) = (float(v) for v in values)
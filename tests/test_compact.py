@@ -0,0 +1,105 @@
+import struct
+
+import pytest
+
+import gx3d
+
+Gearoenix = gx3d.Gearoenix
+
+
+class Material:
+    """Material of generated meshes, only what draw lists use"""
+    instance_type = 1
+    is_tansparent = False
+    is_shadow_caster = True
+    alpha = 1.0
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+
+    def get_key(self):
+        return self.instance_id
+
+    def get_origin(self):
+        return self
+
+    def get_textures(self):
+        return []
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    monkeypatch.setattr(Gearoenix, 'EXPORT_FILE_PATH', str(tmp_path / 'scene.gx3d'))
+    monkeypatch.setattr(Gearoenix, 'EXPORT_GEAROENIX', True)
+    monkeypatch.setattr(Gearoenix, 'EXPORT_VULKUST', False)
+    monkeypatch.setattr(Gearoenix, 'EXPORT_COMPACT', True)
+    monkeypatch.setattr(Gearoenix, 'EXPORT_PROFILES', [Gearoenix.PROFILES[0]])
+    Gearoenix.initialize()
+    for cls in Gearoenix.get_table_classes():
+        cls.init()
+    vertices = [(0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0, 0.0),
+                (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 1.0, 0.0),
+                (0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0, 1.0)]
+    mesh = Gearoenix.Mesh.create_generated('triangle', vertices, [0, 1, 2], Material(7))
+    models = [Gearoenix.Model.create_generated(name, [mesh]) for name in ('first', 'second')]
+    scene = Gearoenix.Scene.__new__(Gearoenix.Scene)
+    scene.init_generated(Gearoenix.Scene.get_prefix() + 'game-level')
+    scene.instance_type = Gearoenix.Scene.TYPE_GAME
+    for name in ('skyboxes', 'cameras', 'lights', 'audios', 'constraints', 'reflections', 'instance_groups'):
+        setattr(scene, name, [])
+    (scene.models, scene.pvs, scene.navmesh) = (models, None, None)
+    Gearoenix.export_profile(Gearoenix.PROFILES[0])
+    with open(Gearoenix.EXPORT_FILE_PATH, 'rb') as f:
+        data = f.read()
+    return (data, mesh, models, scene)
+
+
+def read_floats(reader, count):
+    return struct.unpack('<' + 'f' * count, reader.read(4 * count))
+
+
+def test_scene_round_trip(exported):
+    (data, mesh, models, scene) = exported
+    reader = Gearoenix.CompactReader(data)
+    tables = dict(zip(Gearoenix.get_table_classes(), reader.read_tables()))
+    assert tables[Gearoenix.Mesh] == [(mesh.instance_id, mesh.offset, 'triangle')]
+    assert tables[Gearoenix.Model] == [(m.instance_id, m.offset, m.get_reference_name()) for m in models]
+    assert tables[Gearoenix.Scene] == [(scene.instance_id, scene.offset, 'level')]
+
+    reader.position = mesh.offset
+    assert reader.read_u8() == Gearoenix.Mesh.TYPE_BASIC
+    assert reader.read_varint() == 3
+    read_floats(reader, 3 * 12)
+    assert reader.read_varint() == 3
+    assert struct.unpack('<3I', reader.read(12)) == (0, 1, 2)
+    assert read_floats(reader, 6) == (1.0, 1.0, 0.0, 0.0, 0.0, 0.0)
+    assert reader.position == models[0].offset
+
+    assert reader.read_u8() == Gearoenix.Model.TYPE_STATIC
+    read_floats(reader, 16 + 6)
+    assert reader.read_u8() == Gearoenix.Collider.GHOST
+    assert reader.read_varint() == 1
+    assert (reader.read_id(), reader.read_id()) == (mesh.instance_id, 7)
+    assert reader.read_ids() == []
+    assert reader.read_ids() == []
+    assert reader.position == models[1].offset
+
+    reader.position = scene.offset
+    assert reader.read_u8() == Gearoenix.Scene.TYPE_GAME
+    assert [reader.read_ids() for _ in range(7)] == [
+        [], [], [], [m.instance_id for m in models], [], [], []]
+    nodes_count = reader.read_varint()
+    reader.read(nodes_count * 32)
+    assert reader.read_varint() == len(models)
+    leaves = [(reader.read_u8(), reader.read_id()) for _ in models]
+    assert sorted(leaves) == [(Gearoenix.Scene.DRAW_MODEL, m.instance_id) for m in models]
+    assert reader.read_varint() == 0
+    draws = []
+    for _ in range(4):
+        for _ in range(reader.read_varint()):
+            reader.read(8)
+            draws.append((reader.read_u8(), reader.read_id()))
+            reader.read(4)
+    # Opaque and shadow caster passes of both models
+    assert sorted(draws) == sorted([(Gearoenix.Scene.DRAW_MODEL, m.instance_id) for m in models] * 2)
+    assert reader.read_ids() == [m.instance_id for m in models]
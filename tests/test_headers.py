@@ -0,0 +1,50 @@
+import io
+import os
+
+import pytest
+
+import gx3d
+
+Gearoenix = gx3d.Gearoenix
+
+
+def export_headers(path, modules, vulkust):
+    content = io.StringIO()
+    Gearoenix.header_sections = dict()
+    for mod_name in modules:
+        start = content.tell()
+        content.write('// ' + mod_name + '\n')
+        Gearoenix.header_sections[mod_name] = (start, content.tell())
+    Gearoenix.EXPORT_VULKUST = vulkust
+    Gearoenix.EXPORT_SPLIT_HEADERS = True
+    Gearoenix.EXPORT_FILE_PATH = str(path / 'scene.gx3d')
+    if vulkust:
+        Gearoenix.RUST_FILE = content
+        Gearoenix.HEADER_PATH = str(path / 'scene_gx3d.rs')
+    else:
+        Gearoenix.CPP_FILE = content
+        Gearoenix.HEADER_PATH = str(path / 'scene.gx3d.hpp')
+    Gearoenix.write_headers()
+
+
+@pytest.fixture(autouse=True)
+def restore_flags():
+    yield
+    Gearoenix.EXPORT_VULKUST = False
+    Gearoenix.EXPORT_SPLIT_HEADERS = False
+
+
+def test_stale_cpp_headers_are_removed(tmp_path):
+    (tmp_path / 'notes.hpp').write_text('kept')
+    export_headers(tmp_path, ['Mesh', 'Texture'], False)
+    assert (tmp_path / 'scene.gx3d.texture.hpp').is_file()
+    export_headers(tmp_path, ['Mesh'], False)
+    assert sorted(os.listdir(tmp_path)) == ['notes.hpp', 'scene.gx3d.hpp', 'scene.gx3d.mesh.hpp']
+
+
+def test_stale_rust_modules_are_removed(tmp_path):
+    export_headers(tmp_path, ['Mesh', 'Texture'], True)
+    assert (tmp_path / 'scene_gx3d' / 'texture.rs').is_file()
+    export_headers(tmp_path, ['Texture'], True)
+    assert os.listdir(tmp_path / 'scene_gx3d') == ['texture.rs']
+    assert 'mesh' not in (tmp_path / 'scene_gx3d.rs').read_text()
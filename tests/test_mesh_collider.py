@@ -0,0 +1,68 @@
+import numpy
+import pytest
+
+import gx3d
+
+Gearoenix = gx3d.Gearoenix
+
+
+def make_collider(seed, count):
+    """Random triangle soup of small and a few big triangles"""
+    random = numpy.random.default_rng(seed)
+    centers = random.uniform(-10.0, 10.0, (count, 3))
+    sizes = numpy.where(random.uniform(size=(count, 1)) < 0.1, 5.0, 0.5)
+    corners = centers[:, None, :] + random.uniform(-1.0, 1.0, (count, 3, 3)) * sizes[:, None, :]
+    collider = Gearoenix.MeshCollider.__new__(Gearoenix.MeshCollider)
+    collider.blender_object = None
+    collider.init_triangles(
+        corners.reshape(-1, 3), numpy.arange(count * 3).reshape(-1, 3))
+    return (collider, random)
+
+
+def brute_force_raycast(collider, origin, direction, max_distance):
+    best = None
+    for (t, triangle) in enumerate(collider.triangles):
+        (a, b, c) = collider.vertices[triangle]
+        distance = Gearoenix.MeshCollider.intersect_triangle(origin, direction, a, b, c)
+        if distance is not None and distance <= max_distance and \
+                (best is None or distance < best[0]):
+            best = (distance, t)
+    return best
+
+
+@pytest.mark.parametrize('seed,count', [(0, 1), (1, 7), (2, 200), (3, 1000)])
+def test_order_is_permutation(seed, count):
+    (collider, _) = make_collider(seed, count)
+    assert sorted(collider.bvh.order) == list(range(count))
+
+
+@pytest.mark.parametrize('seed,count', [(4, 3), (5, 200), (6, 1000)])
+def test_raycast_matches_brute_force(seed, count):
+    (collider, random) = make_collider(seed, count)
+    for _ in range(200):
+        origin = random.uniform(-15.0, 15.0, 3)
+        direction = random.normal(size=3)
+        direction /= numpy.linalg.norm(direction)
+        max_distance = random.choice([float('inf'), 10.0])
+        expected = brute_force_raycast(collider, origin, direction, max_distance)
+        result = collider.raycast(origin, direction, max_distance)
+        if expected is None:
+            assert result is None
+        else:
+            assert result is not None
+            assert result[0] == pytest.approx(expected[0])
+
+
+@pytest.mark.parametrize('seed,count', [(7, 3), (8, 200), (9, 1000)])
+def test_overlap_matches_brute_force(seed, count):
+    (collider, random) = make_collider(seed, count)
+    corners = collider.vertices[collider.triangles]
+    lowers = corners.min(axis=1)
+    uppers = corners.max(axis=1)
+    for _ in range(200):
+        center = random.uniform(-12.0, 12.0, 3)
+        extent = random.uniform(0.0, 4.0, 3)
+        (lower, upper) = (center - extent, center + extent)
+        expected = numpy.nonzero(
+            (lowers <= upper).all(axis=1) & (uppers >= lower).all(axis=1))[0]
+        assert sorted(collider.overlap(lower, upper)) == expected.tolist()
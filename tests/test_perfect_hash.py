@@ -0,0 +1,57 @@
+import io
+import sys
+
+import pytest
+
+import gx3d
+
+Gearoenix = gx3d.Gearoenix
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 3, 17, 1000, 5000])
+def test_every_name_is_found(count):
+    names = ['model-thing-%d' % i for i in range(count)]
+    table = Gearoenix.PerfectHash(names)
+    Gearoenix.GX3D_FILE = io.BytesIO()
+    table.write()
+    Gearoenix.GX3D_FILE.seek(0)
+    (displacements, indices) = Gearoenix.PerfectHash.read(Gearoenix.GX3D_FILE)
+    assert sorted(indices) == list(range(count))
+    for (i, name) in enumerate(names):
+        assert Gearoenix.PerfectHash.lookup(name.encode('utf-8'), displacements, indices) == i
+
+
+def test_unicode_names():
+    names = ['mesh-été', 'mesh-漢字', 'mesh-plain']
+    table = Gearoenix.PerfectHash(names)
+    for (i, name) in enumerate(names):
+        assert Gearoenix.PerfectHash.lookup(
+            name.encode('utf-8'), table.displacements, table.indices) == i
+
+
+@pytest.mark.parametrize('name_hash', [False, True])
+@pytest.mark.parametrize('compact', [False, True])
+def test_header_flags(name_hash, compact):
+    Gearoenix.EXPORT_NAME_HASH = name_hash
+    Gearoenix.EXPORT_COMPACT = compact
+    Gearoenix.last_id = 1234
+    Gearoenix.GX3D_FILE = io.BytesIO()
+    try:
+        Gearoenix.write_header()
+    finally:
+        Gearoenix.EXPORT_NAME_HASH = False
+        Gearoenix.EXPORT_COMPACT = False
+    data = Gearoenix.GX3D_FILE.getvalue()
+    # Byte order bool and u64 last id as before the header flags
+    assert len(data) == 9
+    if not name_hash and not compact:
+        assert data[0] == int(sys.byteorder == 'little')
+    reader = Gearoenix.CompactReader(data + bytes(8))
+    if compact:
+        reader.read_header()
+        assert reader.little_endian == (sys.byteorder == 'little')
+        assert reader.last_id == 1234
+        assert (reader.flags & Gearoenix.HEADER_FLAG_NAME_HASH != 0) == name_hash
+    else:
+        with pytest.raises(Exception):
+            reader.read_header()
@@ -0,0 +1,124 @@
+import struct
+
+import numpy
+import pytest
+
+import gx3d
+
+Gearoenix = gx3d.Gearoenix
+
+
+def decode_bc1(block):
+    (c0, c1, bits) = struct.unpack('<HHI', block)
+    endpoints = []
+    for c in (c0, c1):
+        (r, g, b) = (c >> 11, (c >> 5) & 63, c & 31)
+        endpoints.append(numpy.array(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)), float))
+    (p0, p1) = endpoints
+    assert c0 > c1 or bits == 0
+    palette = [p0, p1, (2 * p0 + p1) / 3, (p0 + 2 * p1) / 3]
+    return numpy.array([palette[(bits >> (2 * i)) & 3] for i in range(16)])
+
+
+def decode_bc4(block):
+    (a0, a1) = (float(block[0]), float(block[1]))
+    bits = int.from_bytes(block[2:8], 'little')
+    assert a0 > a1 or bits == 0
+    palette = [a0, a1] + [((8 - i) * a0 + (i - 1) * a1) / 7 for i in range(2, 8)]
+    return numpy.array([palette[(bits >> (3 * i)) & 7] for i in range(16)])
+
+
+def decode(data, width, height, channels):
+    (rows, columns) = ((height + 3) // 4, (width + 3) // 4)
+    size = 16 if channels == 4 else 8
+    assert len(data) == rows * columns * size
+    image = numpy.zeros((rows * 4, columns * 4, 4))
+    for b in range(rows * columns):
+        block = data[b * size:(b + 1) * size]
+        (y, x) = (b // columns * 4, b % columns * 4)
+        image[y:y + 4, x:x + 4, :3] = decode_bc1(block[size - 8:]).reshape(4, 4, 3)
+        if channels == 4:
+            image[y:y + 4, x:x + 4, 3] = decode_bc4(block[:8]).reshape(4, 4)
+    return image[:height, :width, :channels]
+
+
+def smooth_image(width, height, channels, seed):
+    random = numpy.random.default_rng(seed)
+    (y, x) = numpy.mgrid[0:height, 0:width]
+    image = numpy.zeros((height, width, channels))
+    for c in range(channels):
+        (fx, fy, phase) = random.uniform(0.02, 0.2, 3)
+        image[:, :, c] = 127.5 + 120.0 * numpy.sin(x * fx + y * fy + phase * 30.0)
+    return numpy.rint(image).astype(numpy.uint8)
+
+
+@pytest.mark.parametrize('width,height,channels', [
+    (4, 4, 3), (16, 8, 3), (13, 7, 1), (10, 6, 2), (32, 32, 4), (5, 3, 4)])
+def test_block_compression_error_is_small(width, height, channels):
+    pixels = smooth_image(width, height, channels, width * height + channels)
+    data = Gearoenix.encode_bc(pixels)
+    decoded = decode(data, width, height, channels)
+    error = numpy.abs(decoded - pixels).mean()
+    assert error < 6.0
+
+
+def test_flat_block_is_exact():
+    pixels = numpy.full((4, 4, 4), (200, 100, 50, 30), dtype=numpy.uint8)
+    decoded = decode(Gearoenix.encode_bc(pixels), 4, 4, 4)
+    assert numpy.abs(decoded - pixels).max() <= 4
+    assert (decoded[:, :, 3] == 30).all()
+
+
+def test_image_channels():
+    for channels in (1, 2, 3, 4):
+        png = Gearoenix.encode_png(numpy.zeros((2, 3, channels), dtype=numpy.uint8))
+        assert Gearoenix.get_image_channels(png) == channels
+    # SOI, an APP0 segment and a baseline SOF0 of a 3 component image
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + bytes(9)
+    sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, 2, 3, 3) + bytes(9)
+    assert Gearoenix.get_image_channels(b'\xff\xd8' + app0 + sof0) == 3
+    assert Gearoenix.get_image_channels(b'GIF89a' + bytes(30)) is None
+
+
+def make_texture(source, pixels):
+    texture = Gearoenix.Texture.__new__(Gearoenix.Texture)
+    texture.name = 'texture'
+    texture.instance_type = Gearoenix.Texture.TYPE_2D
+    texture.roles = {Gearoenix.Profile.ROLE_COLOR}
+    texture.blend_uses = set()
+    texture.pixels = [pixels]
+    texture.packing = None
+    texture.levels_cache = dict()
+    texture.file = source
+    return texture
+
+
+def test_jpeg_source_passes_through():
+    rgb = smooth_image(8, 8, 3, 1)
+    pixels = numpy.concatenate((rgb, numpy.full((8, 8, 1), 255, dtype=numpy.uint8)), axis=2)
+    sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, 8, 8, 3) + bytes(9)
+    jpeg = b'\xff\xd8' + sof0
+    texture = make_texture(jpeg, pixels)
+    (encoding, levels) = texture.get_levels(Gearoenix.TextureQuality(1024))
+    assert encoding == Gearoenix.Texture.ENCODING_JPEG
+    assert levels == [[(8, 8, jpeg)]]
+    (encoding, levels) = texture.get_levels(Gearoenix.TextureQuality(4))
+    assert encoding == Gearoenix.Texture.ENCODING_PNG
+    assert (levels[0][0][0], levels[0][0][1]) == (4, 4)
+    (encoding, levels) = texture.get_levels(Gearoenix.TextureQuality(
+        1024, Gearoenix.Texture.ENCODING_BC, Gearoenix.Texture.MIPS_BAKED))
+    assert encoding == Gearoenix.Texture.ENCODING_BC
+    assert [len(data) for (_, _, data) in levels[0]] == [32, 8, 8, 8]
+
+
+def test_rgbe_round_trip():
+    random = numpy.random.default_rng(3)
+    pixels = numpy.exp(random.uniform(-8.0, 8.0, (16, 16, 3)))
+    pixels[0, 0] = 0.0
+    rgbe = Gearoenix.encode_rgbe(pixels)
+    exponent = numpy.ldexp(1.0, rgbe[:, :, 3].astype(numpy.int64) - 136)
+    decoded = (rgbe[:, :, :3] + 0.5) * exponent[..., None]
+    decoded[rgbe[:, :, 3] == 0] = 0.0
+    largest = pixels.max(axis=2)[..., None]
+    assert (numpy.abs(decoded - pixels) <= largest / 128.0).all()
+    assert (rgbe[0, 0] == 0).all()